@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+批量生成轨迹：流式读取 JSONL 请求，流式写出 JSONL 轨迹，可断点续跑
+
+请求文件每行一个 JSON 对象:
+    {"distance": 120, "canvas": 280, "temperature": 0.8, "top_p": 0.95, "seed": 42, "adapter": "canvas340", "id": "r1"}
+    只有 distance（或 target_distance）是必填项，canvas（或 canvas_length）默认 280，
+    temperature / top_p 默认使用命令行参数，seed、adapter、id 可选
+
+输出文件每行对应一个请求（顺序与输入一致）:
+    {"line": 1, "id": "r1", "target_distance": 120, "canvas_length": 280, "tracks": [{"a": 0, "b": 0, "c": 0}, ...]}
+    无法解析的请求输出 {"line": 3, "error": "..."}，不影响其他请求
+
+内存占用只与批大小有关：每次读取 batch_size 行，生成后立即追加到输出文件，
+然后原子地更新检查点 {output}.checkpoint.json（输入字节偏移、输出文件大小）。
+中断后使用相同的命令重新运行即可从上一个检查点继续，检查点之后写了一半的输出会被截掉。
+
+同一批中 temperature、top_p 相同的请求一起生成，带 seed 和不带 seed 的请求分开生成。
+带 seed 的一组使用由组内各请求的 (行号, seed) 得到的种子，因此只有在同一个输入文件、
+相同 batch_size 下重新生成才能复现（续跑时批的划分与原来一致）；不带 seed 的请求每次结果都不同。
+
+使用方法:
+    python batch_generate.py --input requests.jsonl --output trajectories.jsonl
+    python batch_generate.py --input requests.jsonl --output trajectories.jsonl --batch_size 256 --adapter canvas340=models/canvas340
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from llm_generator import LLMTrajectoryGenerator
+
+CHECKPOINT_VERSION = 1
+
+# 每批读取并生成的请求数
+DEFAULT_BATCH_SIZE = 64
+
+# 影响生成结果的参数，续跑时必须与检查点一致
+RESUME_OPTIONS = ('batch_size', 'temperature', 'top_p')
+
+
+def checkpoint_path_for(output_path: Path) -> Path:
+    """检查点路径: trajectories.jsonl -> trajectories.jsonl.checkpoint.json"""
+    return output_path.with_name(output_path.name + '.checkpoint.json')
+
+
+def load_checkpoint(checkpoint_path: Path) -> Optional[Dict[str, Any]]:
+    """读取检查点，不存在时返回 None"""
+    if not checkpoint_path.exists():
+        return None
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"不支持的检查点版本: {checkpoint.get('version')}")
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: Path, checkpoint: Dict[str, Any]) -> None:
+    """原子地写入检查点（先写临时文件再替换）"""
+    tmp_path = checkpoint_path.with_name(checkpoint_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _is_number(value: Any) -> bool:
+    """有限的 int/float（不含 bool、NaN、Infinity）"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def parse_request(raw: bytes, temperature: float, top_p: float) -> Dict[str, Any]:
+    """
+    解析一行请求
+
+    Raises:
+        ValueError: JSON 无效、缺少 distance 或字段类型/取值无效
+    """
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"JSON解析失败: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("请求必须是 JSON 对象")
+
+    distance = data.get('distance', data.get('target_distance'))
+    if not _is_number(distance) or distance <= 0:
+        raise ValueError(f"distance 无效: {distance!r}")
+    canvas = data.get('canvas', data.get('canvas_length', 280))
+    if not _is_number(canvas) or canvas <= 0:
+        raise ValueError(f"canvas 无效: {canvas!r}")
+    request_temperature = data.get('temperature', temperature)
+    if not _is_number(request_temperature) or request_temperature <= 0:
+        raise ValueError(f"temperature 必须是正数: {request_temperature!r}")
+    request_top_p = data.get('top_p', top_p)
+    if not _is_number(request_top_p) or not 0 < request_top_p <= 1:
+        raise ValueError(f"top_p 必须在 (0, 1] 之间: {request_top_p!r}")
+    seed = data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise ValueError(f"seed 必须是整数: {seed!r}")
+    adapter = data.get('adapter')
+    if adapter is not None and not isinstance(adapter, str):
+        raise ValueError(f"adapter 必须是字符串: {adapter!r}")
+
+    return {
+        'id': data.get('id'),
+        'target_distance': int(distance),
+        'canvas_length': int(canvas),
+        'temperature': float(request_temperature),
+        'top_p': float(request_top_p),
+        'seed': seed,
+        'adapter': adapter,
+    }
+
+
+def iter_windows(f, batch_size: int, line_no: int) -> Iterator[Tuple[List[Tuple[int, bytes]], int, int]]:
+    """
+    从当前位置按批读取非空行
+
+    Yields:
+        ([(行号, 原始行), ...], 批结束时的字节偏移, 批结束时的行号)
+    """
+    window = []
+    for raw in iter(f.readline, b''):
+        line_no += 1
+        if raw.strip():
+            window.append((line_no, raw))
+        if len(window) >= batch_size:
+            yield window, f.tell(), line_no
+            window = []
+    if window:
+        yield window, f.tell(), line_no
+
+
+def group_seed(members: List[Tuple[int, int]]) -> int:
+    """由组内各请求的 (行号, seed) 得到整组使用的种子"""
+    digest = hashlib.sha256(json.dumps(sorted(members)).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def generate_window(
+    generator: LLMTrajectoryGenerator,
+    window: List[Tuple[int, bytes]],
+    temperature: float,
+    top_p: float
+) -> List[Dict[str, Any]]:
+    """生成一批请求，返回与输入顺序一致的输出记录"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(window)
+
+    # 按采样参数和是否带 seed 分组，同一组在一次 generate_batch 中完成
+    # （不带 seed 的请求不能和带 seed 的放在一起，否则也会被固定种子）
+    groups: Dict[Tuple[float, float, bool], List[Tuple[int, Dict[str, Any]]]] = {}
+    for i, (line_no, raw) in enumerate(window):
+        try:
+            request = parse_request(raw, temperature, top_p)
+        except ValueError as e:
+            results[i] = {'line': line_no, 'error': str(e)}
+            continue
+        key = (request['temperature'], request['top_p'], request['seed'] is not None)
+        groups.setdefault(key, []).append((i, request))
+
+    for (group_temperature, group_top_p, seeded), items in groups.items():
+        requests = [request for _, request in items]
+        seed = group_seed([(window[i][0], request['seed']) for i, request in items]) if seeded else None
+        try:
+            batch_tracks = generator.generate_batch(requests, temperature=group_temperature, top_p=group_top_p, seed=seed)
+        except ValueError:
+            # 例如请求了未加载的适配器：逐条重试，只把出错的请求标记为失败
+            batch_tracks = []
+            for i, request in items:
+                try:
+                    batch_tracks.extend(generator.generate_batch(
+                        [request], temperature=group_temperature, top_p=group_top_p,
+                        seed=group_seed([(window[i][0], request['seed'])]) if seeded else None
+                    ))
+                except ValueError as e:
+                    batch_tracks.append(e)
+
+        for (i, request), tracks in zip(items, batch_tracks):
+            record = {'line': window[i][0]}
+            if request['id'] is not None:
+                record['id'] = request['id']
+            if isinstance(tracks, Exception):
+                record['error'] = str(tracks)
+            else:
+                record.update(
+                    target_distance=request['target_distance'],
+                    canvas_length=request['canvas_length'],
+                    tracks=tracks
+                )
+            results[i] = record
+
+    return results
+
+
+def print_progress(done_bytes: int, total_bytes: int, generated: int, errors: int, rate: float) -> None:
+    """打印单行进度（按输入文件字节数计算百分比）"""
+    percent = (done_bytes / total_bytes) * 100 if total_bytes else 100.0
+    bar_length = 40
+    filled = int(bar_length * done_bytes / total_bytes) if total_bytes else bar_length
+    bar = '█' * filled + '░' * (bar_length - filled)
+    print(f'\r  进度: [{bar}] {percent:.1f}% 已生成 {generated}，错误 {errors}，{rate:.1f} 条/秒', end='', flush=True)
+
+
+def batch_generate(
+    generator: LLMTrajectoryGenerator,
+    input_path: str,
+    output_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    temperature: float = 0.8,
+    top_p: float = 0.95,
+    restart: bool = False
+) -> Dict[str, Any]:
+    """
+    流式批量生成，支持断点续跑
+
+    Args:
+        generator: 轨迹生成器
+        input_path: 请求 JSONL
+        output_path: 输出 JSONL
+        batch_size: 每批请求数
+        temperature: 请求未指定时的采样温度
+        top_p: 请求未指定时的 nucleus sampling 参数
+        restart: 忽略已有检查点，从头开始
+
+    Returns:
+        最终检查点（包含已生成数、错误数等）
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    checkpoint_path = checkpoint_path_for(output_path)
+    options = {'batch_size': batch_size, 'temperature': temperature, 'top_p': top_p}
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        if checkpoint['input'] != str(input_path.resolve()):
+            raise ValueError(f"检查点对应的输入文件是 {checkpoint['input']}，使用 --restart 重新开始")
+        changed = [name for name in RESUME_OPTIONS if checkpoint['options'].get(name) != options[name]]
+        if changed:
+            raise ValueError(f"参数与检查点不一致: {', '.join(changed)}，使用 --restart 重新开始")
+        if checkpoint['done']:
+            print(f"✅ 已全部完成（{checkpoint['generated']} 条），使用 --restart 重新生成")
+            return checkpoint
+        print(f"⏯️  从检查点继续: 第 {checkpoint['lines'] + 1} 行，已生成 {checkpoint['generated']} 条")
+    else:
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'input': str(input_path.resolve()),
+            'options': options,
+            'input_offset': 0,
+            'lines': 0,
+            'output_size': 0,
+            'generated': 0,
+            'errors': 0,
+            'done': False,
+        }
+
+    total_bytes = input_path.stat().st_size
+    if checkpoint['input_offset'] > total_bytes:
+        raise ValueError("输入文件比检查点记录的位置短，可能已被修改，使用 --restart 重新开始")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if checkpoint['output_size'] == 0:
+        open(output_path, 'wb').close()
+
+    start_time = time.time()
+    start_count = checkpoint['generated'] + checkpoint['errors']
+
+    with open(input_path, 'rb') as in_f, open(output_path, 'r+b') as out_f:
+        # 截掉上一个检查点之后写了一半的输出
+        out_f.truncate(checkpoint['output_size'])
+        out_f.seek(checkpoint['output_size'])
+        in_f.seek(checkpoint['input_offset'])
+
+        for window, offset, line_no in iter_windows(in_f, batch_size, checkpoint['lines']):
+            records = generate_window(generator, window, temperature, top_p)
+            out_f.write(b''.join(
+                json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n' for record in records
+            ))
+
+            # 输出先落盘，再更新检查点，检查点永远不会超前于输出
+            out_f.flush()
+            os.fsync(out_f.fileno())
+
+            errors = sum(1 for record in records if 'error' in record)
+            checkpoint.update(
+                input_offset=offset,
+                lines=line_no,
+                output_size=out_f.tell(),
+                generated=checkpoint['generated'] + len(records) - errors,
+                errors=checkpoint['errors'] + errors
+            )
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.time() - start_time
+            rate = (checkpoint['generated'] + checkpoint['errors'] - start_count) / elapsed if elapsed > 0 else 0.0
+            print_progress(offset, total_bytes, checkpoint['generated'], checkpoint['errors'], rate)
+
+    checkpoint['done'] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    print()
+    return checkpoint
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='批量生成轨迹（JSONL 请求 -> JSONL 轨迹，可断点续跑）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 批量生成，中断后重新运行同一命令即可继续
+  python batch_generate.py --input requests.jsonl --output trajectories.jsonl
+
+  # 更大的批次，加载额外的适配器（请求中用 "adapter": "canvas340" 选择）
+  python batch_generate.py --input requests.jsonl --output trajectories.jsonl \\
+      --batch_size 256 --adapter canvas340=models/canvas340
+
+  # 忽略检查点，重新生成
+  python batch_generate.py --input requests.jsonl --output trajectories.jsonl --restart
+        """
+    )
+
+    parser.add_argument('--input', type=str, required=True, help='请求 JSONL 文件')
+    parser.add_argument('--output', type=str, required=True, help='输出 JSONL 文件')
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE, help=f'每批请求数，默认{DEFAULT_BATCH_SIZE}')
+    parser.add_argument('--temperature', type=float, default=0.8, help='默认采样温度，默认0.8')
+    parser.add_argument('--top_p', type=float, default=0.95, help='默认 nucleus sampling 参数，默认0.95')
+    parser.add_argument('--model_path', type=str, default=None, help='模型路径，默认使用模型版本库的当前版本')
+    parser.add_argument('--device', type=str, default=None, help='设备（auto/cpu/cuda/mps）')
+    parser.add_argument(
+        '--adapter',
+        type=str,
+        action='append',
+        default=[],
+        metavar='NAME=PATH',
+        help='额外加载的 LoRA 适配器，可重复指定'
+    )
+    parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+
+    args = parser.parse_args()
+
+    if args.batch_size < 1:
+        parser.error('--batch_size 必须大于 0')
+
+    adapters = {}
+    for spec in args.adapter:
+        name, sep, path = spec.partition('=')
+        if not sep or not name or not path:
+            parser.error(f'--adapter 格式应为 NAME=PATH: {spec}')
+        adapters[name] = path
+
+    generator = LLMTrajectoryGenerator(model_path=args.model_path, device=args.device, adapters=adapters)
+
+    print("=" * 70)
+    print(f"📂 输入: {args.input}")
+    print(f"💾 输出: {args.output}")
+    print(f"📦 批大小: {args.batch_size}")
+    print("=" * 70)
+
+    checkpoint = batch_generate(
+        generator,
+        args.input,
+        args.output,
+        batch_size=args.batch_size,
+        temperature=args.temperature,
+        top_p=args.top_p,
+        restart=args.restart
+    )
+
+    print(f"✅ 已生成: {checkpoint['generated']}，❌ 错误: {checkpoint['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,12 +11,60 @@
     --min_time: 最小总时长（毫秒），默认500
     --max_time: 最大总时长（毫秒），默认3000
     --min_points: 最小轨迹点数，默认10
+    --workers: 并行进程数，默认1（串行），0 表示使用全部CPU核心
+    --quiet: 不逐个打印文件结果，改为显示进度条
+    --max_error_samples: 最多保留的无效文件示例数，默认20
+    --incremental: 增量转换，只处理新增或修改的文件
+    --watch: 监听模式，定期增量转换
+    --interval: 监听模式的轮询间隔（秒），默认2
+    --store_dir: 同时写入轨迹列式存储的目录
+    --from_store: 从轨迹列式存储生成训练数据（代替 --input_dir）
+    --shard_size_mb: 输出为大小受限的分片（MB），并生成字节偏移索引
+    --eval_ratio: 按 id 哈希稳定划分到验证集的比例，大于0时输出为分片
+    --dedup: 去重方式（exact/near）
 """
 
+import os
+import re
 import json
+import time
+import hashlib
 import argparse
+from collections import Counter
+from contextlib import ExitStack
+from functools import partial
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+
+from jsonl_shards import ShardedJsonlWriter, remove_shards, shards_manifest_path
+from trajectory_store import TrajectoryStore, TrajectoryStoreWriter
+
+# 优先使用 orjson 解析（更快），未安装时回退到标准库 json
+try:
+    import orjson
+
+    def _json_loads(raw: bytes) -> Any:
+        return orjson.loads(raw)
+
+    _JSON_DECODE_ERRORS = (orjson.JSONDecodeError,)
+except ImportError:
+    orjson = None
+
+    def _json_loads(raw: bytes) -> Any:
+        return json.loads(raw)
+
+    _JSON_DECODE_ERRORS = (json.JSONDecodeError, UnicodeDecodeError)
+
+# 多进程模式下每批分发给子进程的文件数
+CHUNK_SIZE = 64
+
+# 近似去重时坐标（像素）和时间间隔（毫秒）的量化粒度
+NEAR_DUP_PX = 2
+NEAR_DUP_MS = 10
+
+# 增量转换清单的版本号（格式变化时递增，旧清单将触发全量重建）
+MANIFEST_VERSION = 1
 
 
 def validate_track_data(data: Dict[str, Any], min_time: int, max_time: int, min_points: int) -> tuple[bool, str]:
@@ -76,14 +124,25 @@ def convert_json_to_training_sample(data: Dict[str, Any]) -> str:
     Returns:
         训练样本字符串（JSONL格式）
     """
-    # 提取必要信息
-    distance = data['targetDistance']
-    canvas = data['canvasLength']
-    tracks = data['tracks']
+    points = [(t['a'], t['b'], t['c']) for t in data['tracks']]
+    return format_training_sample(data['targetDistance'], data['canvasLength'], points)
+
+
+def format_training_sample(distance: int, canvas: int, points: Iterable[Sequence[int]]) -> str:
+    """
+    将轨迹点格式化为训练样本
+
+    Args:
+        distance: 目标距离
+        canvas: 画布长度
+        points: 轨迹点 (a, b, c) 序列
 
+    Returns:
+        训练样本字符串（JSONL格式）
+    """
     # 构建轨迹字符串
     # 格式: a,b,c;a,b,c;...
-    track_str = ';'.join([f"{t['a']},{t['b']},{t['c']}" for t in tracks])
+    track_str = ';'.join([f"{a},{b},{c}" for a, b, c in points])
 
     # 构建训练样本
     # 格式: <|input|>distance:{distance},canvas:{canvas}<|output|>{track_str}<|end|>
@@ -93,12 +152,170 @@ def convert_json_to_training_sample(data: Dict[str, Any]) -> str:
     return json.dumps({"text": text}, ensure_ascii=False)
 
 
+def process_json_file(
+    json_file: Path,
+    min_time: int,
+    max_time: int,
+    min_points: int,
+    with_record: bool = False
+) -> Tuple[str, Optional[str], Optional[str], Optional[Dict[str, Any]], Optional[Tuple]]:
+    """
+    读取、验证并转换单个标注文件（可在子进程中执行）
+
+    Args:
+        json_file: 标注文件路径
+        min_time: 最小总时长（毫秒）
+        max_time: 最大总时长（毫秒）
+        min_points: 最小轨迹点数
+        with_record: 是否同时返回数值形式的样本（用于写入列式存储）
+
+    Returns:
+        (文件名, 训练样本或None, 错误信息或None, 文件信息或None, 数值样本或None)
+        文件信息包含 mtime_ns、size 和内容哈希，用于增量转换；
+        数值样本为 (id, targetDistance, canvasLength, [(a, b, c), ...])
+    """
+    meta = None
+    try:
+        # 读取JSON文件
+        with open(json_file, 'rb') as in_f:
+            st = os.fstat(in_f.fileno())
+            raw = in_f.read()
+
+        meta = {
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+            'hash': hashlib.blake2b(raw, digest_size=16).hexdigest()
+        }
+        data = _json_loads(raw)
+
+        # 验证数据质量
+        is_valid, error_msg = validate_track_data(data, min_time, max_time, min_points)
+        if not is_valid:
+            return json_file.name, None, error_msg, meta, None
+
+        # 转换为训练样本
+        record = None
+        if with_record:
+            points = [(t['a'], t['b'], t['c']) for t in data['tracks']]
+            record = (str(data.get('id', json_file.stem)), data['targetDistance'], data['canvasLength'], points)
+        return json_file.name, convert_json_to_training_sample(data), None, meta, record
+
+    except _JSON_DECODE_ERRORS as e:
+        return json_file.name, None, f"JSON解析错误: {e}", meta, None
+
+    except Exception as e:
+        return json_file.name, None, f"处理错误: {e}", meta, None
+
+
+def iter_processed(
+    json_files: List[Path],
+    min_time: int,
+    max_time: int,
+    min_points: int,
+    workers: int,
+    with_record: bool = False
+):
+    """
+    按输入顺序逐个产出 process_json_file 的结果
+
+    workers > 1 时使用进程池，imap 保证结果顺序与输入一致
+    """
+    worker_fn = partial(
+        process_json_file,
+        min_time=min_time,
+        max_time=max_time,
+        min_points=min_points,
+        with_record=with_record
+    )
+
+    if workers <= 1 or len(json_files) <= 1:
+        yield from map(worker_fn, json_files)
+        return
+
+    pool = Pool(min(workers, len(json_files)))
+    try:
+        yield from pool.imap(worker_fn, json_files, chunksize=CHUNK_SIZE)
+        pool.close()
+    except BaseException:
+        # 提前退出（异常或生成器被关闭）时直接终止子进程
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def error_category(error_msg: str) -> str:
+    """
+    将错误信息归类（去掉具体数值和细节），用于聚合统计
+
+    例如 "轨迹点数不足 (5 < 10)" -> "轨迹点数不足"
+    """
+    category = re.split(r'[:(]', error_msg, maxsplit=1)[0].strip()
+    return re.sub(r'\d+', 'N', category)
+
+
+def trajectory_hash(distance: int, canvas: int, points: Iterable[Sequence[int]]) -> bytes:
+    """轨迹内容哈希（与样本 id 无关）"""
+    content = f"{distance},{canvas}|" + ';'.join(f"{a},{b},{c}" for a, b, c in points)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+
+def check_duplicate(record: Tuple, seen_exact: set, seen_near: Optional[set]) -> Optional[str]:
+    """
+    检查样本是否与已写入的样本重复，并登记该样本
+
+    近似重复：坐标按 NEAR_DUP_PX 像素、时间按 NEAR_DUP_MS 毫秒量化后内容相同
+
+    Returns:
+        'duplicates' / 'near_duplicates'，不重复时返回 None
+    """
+    _, distance, canvas, points = record
+
+    exact_key = trajectory_hash(distance, canvas, points)
+    if exact_key in seen_exact:
+        return 'duplicates'
+
+    if seen_near is not None:
+        near_key = trajectory_hash(distance, canvas, [
+            (a // NEAR_DUP_PX, b // NEAR_DUP_PX, c // NEAR_DUP_MS) for a, b, c in points
+        ])
+        if near_key in seen_near:
+            return 'near_duplicates'
+        seen_near.add(near_key)
+
+    seen_exact.add(exact_key)
+    return None
+
+
+def record_error(stats: Dict[str, Any], filename: str, error: str, max_error_samples: int) -> None:
+    """记录一个无效文件的错误：累加分类计数，只保留有限数量的示例"""
+    stats['error_counts'][error_category(error)] += 1
+    if len(stats['error_samples']) < max_error_samples:
+        stats['error_samples'].append((filename, error))
+
+
+def print_progress(done: int, total: int) -> None:
+    """打印单行进度条"""
+    percent = (done / total) * 100 if total else 100.0
+    bar_length = 40
+    filled = int(bar_length * done / total) if total else bar_length
+    bar = '█' * filled + '░' * (bar_length - filled)
+    print(f'\r  进度: [{bar}] {percent:.1f}% ({done}/{total})', end='', flush=True)
+
+
 def convert_to_jsonl(
     input_dir: str,
     output_file: str,
     min_time: int = 500,
     max_time: int = 3000,
-    min_points: int = 10
+    min_points: int = 10,
+    workers: int = 1,
+    quiet: bool = False,
+    max_error_samples: int = 20,
+    store_dir: Optional[str] = None,
+    shard_size_mb: Optional[float] = None,
+    eval_ratio: float = 0.0,
+    dedup: Optional[str] = None
 ) -> None:
     """
     将标注数据转换为JSONL格式
@@ -109,6 +326,13 @@ def convert_to_jsonl(
         min_time: 最小总时长（毫秒）
         max_time: 最大总时长（毫秒）
         min_points: 最小轨迹点数
+        workers: 并行进程数，1 为串行，0 为全部CPU核心
+        quiet: 为True时不逐个打印文件结果，只显示进度条
+        max_error_samples: 最多保留的无效文件示例数
+        store_dir: 同时写入轨迹列式存储的目录（见 trajectory_store.py），None 表示不写
+        shard_size_mb: 分片大小上限（MB），设置后输出为分片（见 jsonl_shards.py）
+        eval_ratio: 按 id 哈希划分到验证集的比例，大于0时输出为分片
+        dedup: 去重方式，None 不去重，'exact' 去除完全相同的轨迹，'near' 同时去除近似重复的轨迹
     """
     input_path = Path(input_dir)
     output_path = Path(output_file)
@@ -123,15 +347,27 @@ def convert_to_jsonl(
         return
 
     # 获取所有JSON文件
-    json_files = list(input_path.glob("*.json"))
+    json_files = sorted(input_path.glob("*.json"))
 
     if not json_files:
         print(f"❌ 错误: 在 {input_dir} 中未找到JSON文件")
         return
 
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
     print(f"📂 输入目录: {input_dir}")
-    print(f"📄 输出文件: {output_file}")
+    sharded = bool(shard_size_mb) or eval_ratio > 0
+    if sharded:
+        print(f"📄 输出分片: {shards_manifest_path(output_path)}（分片上限: {shard_size_mb or '不限'} MB，验证集比例: {eval_ratio}）")
+    else:
+        print(f"📄 输出文件: {output_file}")
+    if dedup:
+        print(f"♻️  去重方式: {dedup}")
+    if store_dir:
+        print(f"🗄️  列式存储: {store_dir}")
     print(f"📊 找到 {len(json_files)} 个JSON文件")
+    print(f"⚙️  并行进程: {workers}，JSON解析器: {'orjson' if orjson else 'json'}")
     print()
     print("🔍 质量过滤条件:")
     print(f"   - 总时长: {min_time}-{max_time}ms")
@@ -139,55 +375,89 @@ def convert_to_jsonl(
     print()
     print("=" * 70)
 
-    # 统计信息
+    # 统计信息（只保留聚合计数和有限的错误示例，避免内存随文件数增长）
     stats = {
         'total': 0,
         'valid': 0,
         'invalid': 0,
-        'errors': []
+        'duplicates': 0,
+        'near_duplicates': 0,
+        'splits': Counter(),
+        'error_counts': Counter(),
+        'error_samples': []
     }
+    seen_exact = set() if dedup else None
+    seen_near = set() if dedup == 'near' else None
 
     # 创建输出目录（如果不存在）
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    # 旧的增量清单记录的是旧的行顺序，先删除；普通输出在转换完成后写入新清单
+    manifest_path = manifest_path_for(output_path)
+    if manifest_path.exists():
+        manifest_path.unlink()
+    # 去重和分片的输出与增量转换的行顺序不一致，不生成清单
+    manifest_entries = {} if not sharded and not dedup else None
+
+    # 输出单个文件时删除旧的分片，否则 train_lora.py 会继续使用旧分片
+    if not sharded and remove_shards(output_path):
+        print(f"🧹 已删除旧的分片: {shards_manifest_path(output_path)}")
+
+    total_files = len(json_files)
+    progress_step = max(1, total_files // 200)
+    with_record = bool(store_dir) or sharded or bool(dedup)
+    results = iter_processed(json_files, min_time, max_time, min_points, workers, with_record=with_record)
+    store_writer = TrajectoryStoreWriter(store_dir) if store_dir else None
+    shard_writer = None
+    if sharded:
+        max_shard_bytes = int(shard_size_mb * 1024 * 1024) if shard_size_mb else None
+        shard_writer = ShardedJsonlWriter(output_path, max_shard_bytes=max_shard_bytes, eval_ratio=eval_ratio)
+        shard_writer.extra['dedup'] = dedup
+
     # 转换数据
-    with open(output_path, 'w', encoding='utf-8') as out_f:
-        for json_file in sorted(json_files):
+    with ExitStack() as stack:
+        out_f = None if sharded else stack.enter_context(open(output_path, 'w', encoding='utf-8'))
+        if shard_writer:
+            stack.enter_context(shard_writer)
+        if store_writer:
+            stack.enter_context(store_writer)
+
+        for filename, training_sample, error, meta, record in results:
             stats['total'] += 1
-
-            try:
-                # 读取JSON文件
-                with open(json_file, 'r', encoding='utf-8') as in_f:
-                    data = json.load(in_f)
-
-                # 验证数据质量
-                is_valid, error_msg = validate_track_data(data, min_time, max_time, min_points)
-
-                if is_valid:
-                    # 转换为训练样本
-                    training_sample = convert_json_to_training_sample(data)
-
+            if manifest_entries is not None and meta is not None:
+                manifest_entries[filename] = dict(meta, valid=training_sample is not None)
+
+            if training_sample is not None:
+                duplicate = check_duplicate(record, seen_exact, seen_near) if dedup else None
+                if duplicate:
+                    stats[duplicate] += 1
+                    if not quiet:
+                        print(f"♻️  {filename}: {'重复' if duplicate == 'duplicates' else '近似重复'}轨迹，已跳过")
+                else:
                     # 写入JSONL文件
-                    out_f.write(training_sample + '\n')
-
+                    if shard_writer:
+                        stats['splits'][shard_writer.write(record[0], training_sample)] += 1
+                    else:
+                        out_f.write(training_sample + '\n')
+                    if store_writer:
+                        store_writer.add(*record)
                     stats['valid'] += 1
-                    print(f"✅ {json_file.name}")
-                else:
-                    stats['invalid'] += 1
-                    stats['errors'].append((json_file.name, error_msg))
-                    print(f"⚠️  {json_file.name}: {error_msg}")
-
-            except json.JSONDecodeError as e:
+                    if not quiet:
+                        print(f"✅ {filename}")
+            else:
                 stats['invalid'] += 1
-                error = f"JSON解析错误: {e}"
-                stats['errors'].append((json_file.name, error))
-                print(f"❌ {json_file.name}: {error}")
+                record_error(stats, filename, error, max_error_samples)
+                if not quiet:
+                    print(f"⚠️  {filename}: {error}")
 
-            except Exception as e:
-                stats['invalid'] += 1
-                error = f"处理错误: {e}"
-                stats['errors'].append((json_file.name, error))
-                print(f"❌ {json_file.name}: {error}")
+            if quiet and (stats['total'] % progress_step == 0 or stats['total'] == total_files):
+                print_progress(stats['total'], total_files)
+
+    if manifest_entries is not None:
+        write_manifest(output_path, {'min_time': min_time, 'max_time': max_time, 'min_points': min_points}, manifest_entries)
+
+    if quiet:
+        print()  # 换行
 
     # 输出统计信息
     print()
@@ -196,20 +466,329 @@ def convert_to_jsonl(
     print(f"   总文件数: {stats['total']}")
     print(f"   ✅ 有效: {stats['valid']}")
     print(f"   ⚠️  无效: {stats['invalid']}")
+    if dedup:
+        print(f"   ♻️  重复: {stats['duplicates']}，近似重复: {stats['near_duplicates']}")
     print()
 
-    if stats['valid'] > 0:
+    if stats['valid'] > 0 and sharded:
+        print(f"✅ 成功生成训练数据分片: {shards_manifest_path(output_path)}")
+        for split, count in sorted(stats['splits'].items()):
+            print(f"   {split}: {count} 个训练样本")
+    elif stats['valid'] > 0:
         print(f"✅ 成功生成训练数据: {output_file}")
         print(f"   包含 {stats['valid']} 个训练样本")
     else:
         print("❌ 未生成任何有效的训练样本")
 
     # 显示错误详情
-    if stats['errors']:
-        print()
-        print("⚠️  无效文件详情:")
-        for filename, error in stats['errors']:
-            print(f"   - {filename}: {error}")
+    print_error_summary(stats, max_error_samples)
+
+
+def convert_store_to_jsonl(store_dir: str, output_file: str) -> None:
+    """
+    从轨迹列式存储生成训练数据（不再读取和解析标注JSON文件）
+
+    Args:
+        store_dir: 列式存储目录
+        output_file: 输出文件路径
+    """
+    store = TrajectoryStore(store_dir)
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"🗄️  列式存储: {store_dir}（{len(store)} 个样本，{store.meta['num_points']} 个轨迹点）")
+    print(f"📄 输出文件: {output_file}")
+
+    if remove_shards(output_path):
+        print(f"🧹 已删除旧的分片: {shards_manifest_path(output_path)}")
+
+    with open(output_path, 'w', encoding='utf-8') as out_f:
+        for _, distance, canvas, tracks in store:
+            out_f.write(format_training_sample(distance, canvas, tracks.tolist()) + '\n')
+
+    print(f"✅ 成功生成训练数据: {output_file}")
+    print(f"   包含 {len(store)} 个训练样本")
+
+
+def print_error_summary(stats: Dict[str, Any], max_error_samples: int) -> None:
+    """打印无效原因统计和示例"""
+    if not stats['error_counts']:
+        return
+
+    print()
+    print("⚠️  无效原因统计:")
+    for category, count in stats['error_counts'].most_common():
+        print(f"   - {category}: {count}")
+
+    print()
+    print(f"⚠️  无效文件示例（最多 {max_error_samples} 个）:")
+    for filename, error in stats['error_samples']:
+        print(f"   - {filename}: {error}")
+
+
+def manifest_path_for(output_path: Path) -> Path:
+    """增量转换清单的路径（与输出文件放在一起）"""
+    return output_path.with_name(output_path.name + '.manifest.json')
+
+
+def load_manifest(manifest_path: Path, output_path: Path, options: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """
+    加载增量转换清单
+
+    清单不存在、版本/过滤条件不一致，或输出文件已被外部修改时返回 None（需要全量重建）
+    """
+    if not manifest_path.exists() or not output_path.exists():
+        return None
+
+    try:
+        with open(manifest_path, 'rb') as f:
+            manifest = _json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('options') != options:
+        return None
+
+    # 输出文件被全量转换或手动编辑后，行顺序可能已经与清单不一致
+    st = output_path.stat()
+    if manifest.get('output_size') != st.st_size or manifest.get('output_mtime_ns') != st.st_mtime_ns:
+        return None
+
+    return manifest
+
+
+def save_manifest(manifest_path: Path, manifest: Dict[str, Any]) -> None:
+    """原子地写入增量转换清单"""
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def write_manifest(output_path: Path, options: Dict[str, int], entries: Dict[str, Dict[str, Any]]) -> None:
+    """为输出文件写入增量转换清单（entries 中有效条目的顺序必须与输出文件的行顺序一致）"""
+    st = output_path.stat()
+    save_manifest(manifest_path_for(output_path), {
+        'version': MANIFEST_VERSION,
+        'options': options,
+        'output_size': st.st_size,
+        'output_mtime_ns': st.st_mtime_ns,
+        'files': entries
+    })
+
+
+def convert_incremental(
+    input_dir: str,
+    output_file: str,
+    min_time: int = 500,
+    max_time: int = 3000,
+    min_points: int = 10,
+    workers: int = 1,
+    max_error_samples: int = 20
+) -> Optional[Dict[str, Any]]:
+    """
+    增量转换：只处理新增或修改过的标注文件
+
+    清单（{output_file}.manifest.json）记录每个源文件的 mtime、大小、内容哈希以及是否产生了训练样本，
+    有效条目的顺序与输出文件中的行顺序一致。
+    - 只有新增文件时，直接追加到输出文件末尾
+    - 有文件被修改或删除时，流式地逐行重写输出文件（未变化的行直接复制，不重新解析源文件）
+    - 新增文件（包括全量重建时的所有文件）处理后直接写出，内存中只保留修改过的文件的结果
+
+    Args:
+        input_dir: 标注数据目录
+        output_file: 输出文件路径
+        min_time: 最小总时长（毫秒）
+        max_time: 最大总时长（毫秒）
+        min_points: 最小轨迹点数
+        workers: 并行进程数，1 为串行，0 为全部CPU核心
+        max_error_samples: 最多保留的无效文件示例数
+
+    Returns:
+        统计信息（added/updated/removed/unchanged/valid 等），输入目录无效时返回 None
+    """
+    input_path = Path(input_dir)
+    output_path = Path(output_file)
+    manifest_path = manifest_path_for(output_path)
+
+    if not input_path.is_dir():
+        print(f"❌ 错误: 输入目录不存在或不是目录: {input_dir}")
+        return None
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    options = {'min_time': min_time, 'max_time': max_time, 'min_points': min_points}
+    manifest = load_manifest(manifest_path, output_path, options)
+    rebuild = manifest is None
+    old_entries = {} if rebuild else manifest['files']
+
+    stats = {
+        'rebuild': rebuild,
+        'added': 0,
+        'updated': 0,
+        'removed': 0,
+        'unchanged': 0,
+        'valid': 0,
+        'invalid': 0,
+        'error_counts': Counter(),
+        'error_samples': []
+    }
+
+    # 对比文件状态，找出新增和可能被修改的文件
+    current_files = {p.name: p for p in sorted(input_path.glob("*.json"))}
+    to_add = []
+    to_update = []
+    for name, path in current_files.items():
+        entry = old_entries.get(name)
+        if entry is None:
+            to_add.append(path)
+            continue
+        st = path.stat()
+        if entry['mtime_ns'] != st.st_mtime_ns or entry['size'] != st.st_size:
+            to_update.append(path)
+
+    removed = [name for name in old_entries if name not in current_files]
+
+    # 处理可能被修改的文件（只在内存中保留这部分结果，重写时替换对应的行）
+    processed = {}
+    refreshed = False
+    for filename, training_sample, error, meta, _ in iter_processed(
+        to_update, min_time, max_time, min_points, workers
+    ):
+        if meta is None:
+            # 文件在处理期间消失或无法读取，下次再处理
+            continue
+        old = old_entries.get(filename)
+        if old is not None and old['hash'] == meta['hash']:
+            # 只是 mtime 变化，内容没变
+            old.update(mtime_ns=meta['mtime_ns'], size=meta['size'])
+            refreshed = True
+            continue
+        processed[filename] = (training_sample, error, meta)
+
+    changed = list(processed)
+    stats['updated'] = len(changed)
+    stats['removed'] = len(removed)
+
+    # 生成新的清单条目（保持旧条目顺序，新文件在写出时追加在末尾）
+    removed_set = set(removed)
+    new_entries = {}
+    for name, entry in old_entries.items():
+        if name in removed_set:
+            continue
+        if name in processed:
+            training_sample, _, meta = processed[name]
+            entry = dict(meta, valid=training_sample is not None)
+        new_entries[name] = entry
+
+    for name, (training_sample, error, _) in processed.items():
+        if training_sample is None:
+            record_error(stats, name, error, max_error_samples)
+
+    def write_added(out_f) -> None:
+        """逐个处理新增文件并直接写出（不在内存中保留训练样本）"""
+        for filename, training_sample, error, meta, _ in iter_processed(
+            to_add, min_time, max_time, min_points, workers
+        ):
+            if meta is None:
+                # 文件在处理期间消失或无法读取，下次再处理
+                continue
+            stats['added'] += 1
+            new_entries[filename] = dict(meta, valid=training_sample is not None)
+            if training_sample is not None:
+                out_f.write(training_sample + '\n')
+            else:
+                record_error(stats, filename, error, max_error_samples)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if remove_shards(output_path):
+        print(f"🧹 已删除旧的分片: {shards_manifest_path(output_path)}")
+
+    if rebuild or changed or removed:
+        # 流式重写：逐行复制未变化的样本，替换修改过的样本，跳过已删除的样本
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as out_f:
+            old_lines = open(output_path, 'r', encoding='utf-8') if not rebuild else None
+            try:
+                for name, entry in old_entries.items():
+                    old_line = old_lines.readline() if entry['valid'] else None
+                    if name in removed_set:
+                        continue
+                    if name in processed:
+                        training_sample = processed[name][0]
+                        if training_sample is not None:
+                            out_f.write(training_sample + '\n')
+                    elif old_line is not None:
+                        out_f.write(old_line)
+            finally:
+                if old_lines:
+                    old_lines.close()
+
+            write_added(out_f)
+        os.replace(tmp_path, output_path)
+    elif to_add:
+        # 只有新增文件：直接追加
+        with open(output_path, 'a', encoding='utf-8') as out_f:
+            write_added(out_f)
+
+    stats['valid'] = sum(1 for entry in new_entries.values() if entry['valid'])
+    stats['invalid'] = len(new_entries) - stats['valid']
+    stats['unchanged'] = len(new_entries) - stats['added'] - stats['updated']
+
+    # 没有任何变化时不重写清单（监听模式下每次轮询都会调用）
+    if rebuild or stats['added'] or changed or removed or refreshed:
+        write_manifest(output_path, options, new_entries)
+
+    return stats
+
+
+def print_incremental_summary(stats: Dict[str, Any], output_file: str, max_error_samples: int) -> None:
+    """打印增量转换结果"""
+    mode = "全量重建" if stats['rebuild'] else "增量更新"
+    print(
+        f"🔄 {mode}: 新增 {stats['added']}，修改 {stats['updated']}，"
+        f"删除 {stats['removed']}，未变 {stats['unchanged']}"
+    )
+    print(f"✅ {output_file}: {stats['valid']} 个训练样本（{stats['invalid']} 个无效文件）")
+    print_error_summary(stats, max_error_samples)
+
+
+def watch_and_convert(
+    input_dir: str,
+    output_file: str,
+    interval: float = 2.0,
+    max_error_samples: int = 20,
+    **kwargs
+) -> None:
+    """
+    监听模式：定期增量转换，保持训练数据与标注目录同步（Ctrl+C 退出）
+
+    Args:
+        input_dir: 标注数据目录
+        output_file: 输出文件路径
+        interval: 轮询间隔（秒）
+        max_error_samples: 最多保留的无效文件示例数
+        **kwargs: 传给 convert_incremental 的其他参数
+    """
+    print(f"👀 监听目录: {input_dir}（每 {interval}s 检查一次，Ctrl+C 退出）")
+    print(f"📄 输出文件: {output_file}")
+    print()
+
+    try:
+        while True:
+            stats = convert_incremental(input_dir, output_file, max_error_samples=max_error_samples, **kwargs)
+            if stats is None:
+                return
+
+            if stats['rebuild'] or stats['added'] or stats['updated'] or stats['removed']:
+                print(f"[{time.strftime('%H:%M:%S')}]", end=' ')
+                print_incremental_summary(stats, output_file, max_error_samples)
+                print()
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n👋 已停止监听")
 
 
 def main():
@@ -230,6 +809,42 @@ def main():
       --max_time 2000 \\
       --min_points 15
 
+  # 大规模数据：8进程并行，只显示进度条
+  python convert_to_jsonl.py \\
+      --input_dir captcha_dataset/metadata \\
+      --output_file training_data.jsonl \\
+      --workers 8 \\
+      --quiet
+
+  # 增量转换：只处理新增/修改的文件，删除的文件对应样本会被移除
+  python convert_to_jsonl.py \\
+      --input_dir captcha_dataset/metadata \\
+      --output_file training_data.jsonl \\
+      --incremental
+
+  # 监听模式：标注过程中持续更新训练数据
+  python convert_to_jsonl.py \\
+      --input_dir captcha_dataset/metadata \\
+      --output_file training_data.jsonl \\
+      --watch --interval 5
+
+  # 同时写入列式存储，之后可直接从存储重新生成训练数据
+  python convert_to_jsonl.py \\
+      --input_dir captcha_dataset/metadata \\
+      --output_file training_data.jsonl \\
+      --store_dir captcha_dataset/trajectory_store
+  python convert_to_jsonl.py \\
+      --from_store captcha_dataset/trajectory_store \\
+      --output_file training_data.jsonl
+
+  # 去除近似重复轨迹，按 id 稳定划分 10% 验证集，输出 32MB 分片
+  python convert_to_jsonl.py \\
+      --input_dir captcha_dataset/metadata \\
+      --output_file training_data.jsonl \\
+      --dedup near \\
+      --eval_ratio 0.1 \\
+      --shard_size_mb 32
+
   # 使用相对路径
   python convert_to_jsonl.py \\
       --input_dir ../captcha_dataset/metadata \\
@@ -240,8 +855,7 @@ def main():
     parser.add_argument(
         '--input_dir',
         type=str,
-        required=True,
-        help='标注数据目录（包含JSON文件）'
+        help='标注数据目录（包含JSON文件），使用 --from_store 时可省略'
     )
 
     parser.add_argument(
@@ -272,15 +886,136 @@ def main():
         help='最小轨迹点数，默认10'
     )
 
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='并行进程数，默认1（串行），0 表示使用全部CPU核心'
+    )
+
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='不逐个打印文件结果，改为显示进度条'
+    )
+
+    parser.add_argument(
+        '--max_error_samples',
+        type=int,
+        default=20,
+        help='最多保留的无效文件示例数，默认20'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='增量转换：只处理新增或修改的文件（清单保存在 {output_file}.manifest.json）'
+    )
+
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='监听模式：定期增量转换，保持训练数据最新（Ctrl+C 退出）'
+    )
+
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=2.0,
+        help='监听模式的轮询间隔（秒），默认2'
+    )
+
+    parser.add_argument(
+        '--store_dir',
+        type=str,
+        default=None,
+        help='同时写入轨迹列式存储（可用 np.memmap 零拷贝读取）的目录'
+    )
+
+    parser.add_argument(
+        '--from_store',
+        type=str,
+        default=None,
+        help='从已有的轨迹列式存储生成训练数据，不读取标注JSON文件'
+    )
+
+    parser.add_argument(
+        '--shard_size_mb',
+        type=float,
+        default=None,
+        help='输出为大小受限的分片（MB），并生成字节偏移索引'
+    )
+
+    parser.add_argument(
+        '--eval_ratio',
+        type=float,
+        default=0.0,
+        help='按 id 哈希稳定划分到验证集的比例（如 0.1），大于0时输出为分片'
+    )
+
+    parser.add_argument(
+        '--dedup',
+        choices=['exact', 'near'],
+        default=None,
+        help='去重：exact 去除完全相同的轨迹，near 同时去除近似重复的轨迹'
+    )
+
     args = parser.parse_args()
 
+    if args.from_store:
+        convert_store_to_jsonl(args.from_store, args.output_file)
+        return
+
+    if not args.input_dir:
+        parser.error('需要 --input_dir（或使用 --from_store）')
+
+    if (args.incremental or args.watch) and (args.store_dir or args.shard_size_mb or args.eval_ratio > 0 or args.dedup):
+        parser.error('--store_dir/--shard_size_mb/--eval_ratio/--dedup 只支持全量转换，不能与 --incremental/--watch 同时使用')
+
+    if not 0 <= args.eval_ratio < 1:
+        parser.error('--eval_ratio 必须在 [0, 1) 范围内')
+
+    if args.watch:
+        watch_and_convert(
+            input_dir=args.input_dir,
+            output_file=args.output_file,
+            interval=args.interval,
+            max_error_samples=args.max_error_samples,
+            min_time=args.min_time,
+            max_time=args.max_time,
+            min_points=args.min_points,
+            workers=args.workers
+        )
+        return
+
+    if args.incremental:
+        stats = convert_incremental(
+            input_dir=args.input_dir,
+            output_file=args.output_file,
+            min_time=args.min_time,
+            max_time=args.max_time,
+            min_points=args.min_points,
+            workers=args.workers,
+            max_error_samples=args.max_error_samples
+        )
+        if stats is not None:
+            print_incremental_summary(stats, args.output_file, args.max_error_samples)
+        return
+
     # 转换数据
     convert_to_jsonl(
         input_dir=args.input_dir,
         output_file=args.output_file,
         min_time=args.min_time,
         max_time=args.max_time,
-        min_points=args.min_points
+        min_points=args.min_points,
+        workers=args.workers,
+        quiet=args.quiet,
+        max_error_samples=args.max_error_samples,
+        store_dir=args.store_dir,
+        shard_size_mb=args.shard_size_mb,
+        eval_ratio=args.eval_ratio,
+        dedup=args.dedup
     )
 
 
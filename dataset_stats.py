@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+轨迹数据集统计（NumPy 向量化）
+
+支持三种输入：
+    - 训练数据 JSONL（training_data.jsonl）
+    - 标注数据目录（metadata/*.json）
+    - 轨迹列式存储目录（convert_to_jsonl.py --store_dir 生成，见 trajectory_store.py）
+
+统计内容：
+    - 每个样本的轨迹点数、总时长直方图
+    - 每一步的 dt / dx / dy 直方图
+    - 按目标距离分桶的汇总（样本数、点数/时长的均值和分位数、终点误差）
+
+使用方法:
+    python dataset_stats.py --input training_data.jsonl --output stats.json
+    python dataset_stats.py --input captcha_dataset/metadata --output stats.csv
+"""
+
+import argparse
+import csv
+import json
+import re
+import time
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from convert_to_jsonl import iter_processed
+from trajectory_store import TrajectoryStore
+
+# 每批处理的样本数（控制内存占用）
+BATCH_SIZE = 100_000
+
+# 直方图范围: 名称 -> (最小值, 最大值, 桶宽)，越界值计入两端的桶
+HISTOGRAM_RANGES = {
+    'points': (0, 200, 5),
+    'duration': (0, 10000, 100),
+    'dt': (0, 500, 10),
+    'dx': (-20, 60, 2),
+    'dy': (-10, 10, 1),
+}
+
+PERCENTILES = [10, 50, 90, 99]
+
+# 轨迹部分的格式在解析数字串时检查（见 _parse_samples）
+TEXT_PATTERN = re.compile(r'distance:(-?\d{1,9}),canvas:(-?\d{1,9})<\|output\|>([^<\n"]*)')
+OUTPUT_MARKER = '<|output|>'
+
+# 格式完整的轨迹: a,b,c;a,b,c;...（可带结尾分号，数字不超过 9 位，不会溢出 int32）
+TRACKS_PATTERN = re.compile(r'-?\d{1,9},-?\d{1,9},-?\d{1,9}(?:;-?\d{1,9},-?\d{1,9},-?\d{1,9})*;?')
+
+# 读取 JSONL 时每个数据块的大小（字节）
+JSONL_CHUNK_BYTES = 32 * 1024 * 1024
+
+# 拼接数字串时标记样本开头的哨兵值（不可能出现在轨迹数据中）
+SAMPLE_SENTINEL = 2 ** 62
+
+# 一批轨迹: (target_distance, canvas_length, offsets, points, skipped)
+# offsets 长度为样本数 + 1，第 i 个样本的点为 points[offsets[i]:offsets[i+1]]
+# skipped 为这一批中因格式错误被跳过的样本数
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]
+
+
+def _make_batch(
+    distances: List[int],
+    canvases: List[int],
+    lengths: List[int],
+    points: np.ndarray,
+    skipped: int = 0
+) -> Batch:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return (
+        np.asarray(distances, dtype=np.int32),
+        np.asarray(canvases, dtype=np.int32),
+        offsets,
+        points.reshape(-1, 3),
+        skipped
+    )
+
+
+def _jsonl_ranges(path: Path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """把文件按行边界切分成大约 chunk_bytes 大小的字节区间"""
+    size = path.stat().st_size
+    ranges = []
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _parse_jsonl_range(path: Path, byte_range: Tuple[int, int]) -> Optional[Batch]:
+    """
+    解析 JSONL 文件的一个字节区间（可在子进程中执行）
+
+    用一次 findall 提取所有样本，拼接成 "哨兵,距离,画布,a,b,c,a,b,c,..." 的数字串后
+    用一次 np.fromstring 解析，再根据哨兵位置向量化地拆出每个样本，避免逐点 split/int。
+    数字串中有空字段、多余负号等格式错误时（np.fromstring 会报错或静默解析成 0），
+    改为逐个样本用 TRACKS_PATTERN 检查，只跳过格式错误的样本
+    """
+    start, end = byte_range
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+
+    samples = TEXT_PATTERN.findall(text)
+    skipped = text.count(OUTPUT_MARKER) - len(samples)
+
+    nums = _parse_samples(samples)
+    if nums is None:
+        good = [
+            (distance, canvas, tracks.rstrip(';'))
+            for distance, canvas, tracks in samples if TRACKS_PATTERN.fullmatch(tracks)
+        ]
+        skipped += len(samples) - len(good)
+        nums = _parse_samples(good, validated=True)
+
+    if nums is None or len(nums) == 0:
+        return _make_batch([], [], [], np.zeros((0, 3), dtype=np.int32), skipped) if skipped else None
+
+    starts = np.flatnonzero(nums == SAMPLE_SENTINEL)
+    sizes = np.diff(np.append(starts, len(nums)))
+
+    # 丢弃数字个数不是 3 的倍数的样本
+    good = (sizes >= 6) & ((sizes - 3) % 3 == 0)
+    if not good.all():
+        skipped += int((~good).sum())
+        nums = nums[np.repeat(good, sizes)]
+        sizes = sizes[good]
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+
+    header = np.zeros(len(nums), dtype=bool)
+    header[starts] = True
+    header[starts + 1] = True
+    header[starts + 2] = True
+
+    lengths = (sizes - 3) // 3
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return (
+        nums[starts + 1].astype(np.int32),
+        nums[starts + 2].astype(np.int32),
+        offsets,
+        nums[~header].astype(np.int32).reshape(-1, 3),
+        skipped
+    )
+
+
+def _parse_samples(samples: List[Tuple[str, str, str]], validated: bool = False) -> Optional[np.ndarray]:
+    """
+    把 (距离, 画布, 轨迹) 拼接成以哨兵分隔的数字串并一次性解析
+
+    Args:
+        samples: findall 得到的样本
+        validated: 轨迹已经通过 TRACKS_PATTERN 检查，不再核对
+
+    Returns:
+        int64 数组；数字串中有任何格式错误时返回 None
+    """
+    if not samples:
+        return np.zeros(0, dtype=np.int64)
+
+    sentinel = str(SAMPLE_SENTINEL)
+    joined = ','.join([f"{sentinel},{distance},{canvas},{tracks}" for distance, canvas, tracks in samples])
+    joined = joined.replace(';', ',')
+    if validated:
+        return np.fromstring(joined, dtype=np.int64, sep=',')
+
+    # np.fromstring 遇到非数字、空字段会报错，但会忽略结尾的逗号、把单独的负号解析成 0，
+    # 因此再核对数字个数和负数个数（"-0" 也会走逐个样本检查，结果不变）
+    try:
+        nums = np.fromstring(joined, dtype=np.int64, sep=',')
+    except ValueError:
+        return None
+    if len(nums) != joined.count(',') + 1 or np.count_nonzero(nums < 0) != joined.count('-'):
+        return None
+
+    # 除哨兵外的数字都必须在 int32 范围内（超长数字会被截断成 int64 最大值）
+    if np.count_nonzero((nums > np.iinfo(np.int32).max) | (nums < np.iinfo(np.int32).min)) != len(samples):
+        return None
+    return nums
+
+
+def iter_jsonl_batches(path: Path, workers: int = 1, chunk_bytes: int = JSONL_CHUNK_BYTES) -> Iterator[Batch]:
+    """从训练数据 JSONL 读取轨迹，workers > 1 时多个数据块并行解析"""
+    ranges = _jsonl_ranges(path, chunk_bytes)
+    parse = partial(_parse_jsonl_range, path)
+
+    if workers <= 1 or len(ranges) <= 1:
+        batches = map(parse, ranges)
+        yield from (batch for batch in batches if batch is not None)
+        return
+
+    with Pool(min(workers, len(ranges))) as pool:
+        for batch in pool.imap(parse, ranges):
+            if batch is not None:
+                yield batch
+
+
+def iter_metadata_batches(path: Path, workers: int = 1, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+    """从标注数据目录读取轨迹（不做质量过滤，只跳过缺少字段或无法解析的文件）"""
+    json_files = sorted(path.glob("*.json"))
+    distances, canvases, lengths, points = [], [], [], []
+    skipped = 0
+
+    for _, training_sample, _, _, record in iter_processed(
+        json_files, min_time=0, max_time=float('inf'), min_points=0, workers=workers, with_record=True
+    ):
+        if training_sample is None:
+            skipped += 1
+            continue
+        _, distance, canvas, tracks = record
+        distances.append(distance)
+        canvases.append(canvas)
+        lengths.append(len(tracks))
+        points.extend(tracks)
+
+        if len(distances) >= batch_size:
+            yield _make_batch(distances, canvases, lengths, np.asarray(points, dtype=np.int32), skipped)
+            distances, canvases, lengths, points = [], [], [], []
+            skipped = 0
+
+    if distances or skipped:
+        yield _make_batch(distances, canvases, lengths, np.asarray(points, dtype=np.int32), skipped)
+
+
+def iter_store_batches(path: Path, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+    """从轨迹列式存储读取轨迹（直接切片 memmap，不复制数据）"""
+    store = TrajectoryStore(path)
+    for start in range(0, len(store), batch_size):
+        end = min(start + batch_size, len(store))
+        offsets = store.offsets[start:end + 1]
+        yield (
+            store.target_distance[start:end],
+            store.canvas_length[start:end],
+            offsets - offsets[0],
+            store.points[offsets[0]:offsets[-1]],
+            0
+        )
+
+
+def iter_batches(input_path: Path, workers: int = 1) -> Iterator[Batch]:
+    """根据输入类型选择读取方式"""
+    if input_path.is_dir():
+        if (input_path / 'meta.json').exists():
+            return iter_store_batches(input_path)
+        return iter_metadata_batches(input_path, workers=workers)
+    return iter_jsonl_batches(input_path, workers=workers)
+
+
+class HistogramAccumulator:
+    """固定分桶的直方图，可逐批累加"""
+
+    def __init__(self, lo: int, hi: int, width: int):
+        self.lo = lo
+        self.hi = hi
+        self.width = width
+        self.counts = np.zeros((hi - lo) // width, dtype=np.int64)
+
+    def add(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        index = (np.asarray(values, dtype=np.int64) - self.lo) // self.width
+        np.clip(index, 0, len(self.counts) - 1, out=index)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+
+    def to_dict(self) -> Dict[str, Any]:
+        edges = self.lo + self.width * np.arange(len(self.counts) + 1)
+        return {
+            'edges': edges.tolist(),
+            'counts': self.counts.tolist(),
+        }
+
+
+class StepMoments:
+    """逐批累加的计数、均值、标准差和最值（每一步的数据量太大，不保留原始值）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        values = values.astype(np.float64)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_sq += float(np.dot(values, values))
+        self.min = values.min() if self.min is None else min(self.min, values.min())
+        self.max = values.max() if self.max is None else max(self.max, values.max())
+
+    def to_dict(self) -> Dict[str, float]:
+        if self.count == 0:
+            return {'count': 0}
+        mean = self.total / self.count
+        return {
+            'count': self.count,
+            'mean': round(mean, 3),
+            'std': round(max(self.total_sq / self.count - mean * mean, 0.0) ** 0.5, 3),
+            'min': int(self.min),
+            'max': int(self.max),
+        }
+
+
+def _summary(values: np.ndarray) -> Dict[str, float]:
+    """均值、标准差、最值和分位数"""
+    if len(values) == 0:
+        return {'count': 0}
+    result = {
+        'count': int(len(values)),
+        'mean': round(float(values.mean()), 3),
+        'std': round(float(values.std()), 3),
+        'min': int(values.min()),
+        'max': int(values.max()),
+    }
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        result[f'p{p}'] = round(float(v), 3)
+    return result
+
+
+def compute_stats(batches: Iterator[Batch], bucket_size: int = 20) -> Dict[str, Any]:
+    """
+    计算数据集统计
+
+    每个样本的标量（目标距离、点数、总时长、终点误差）在内存中拼接，
+    每一步的 dt/dx/dy 只累加到直方图，内存不随轨迹点总数增长
+
+    Args:
+        batches: 轨迹批次
+        bucket_size: 目标距离分桶宽度（像素）
+
+    Returns:
+        统计结果字典
+    """
+    step_hists = {name: HistogramAccumulator(*HISTOGRAM_RANGES[name]) for name in ('dt', 'dx', 'dy')}
+    step_moments = {name: StepMoments() for name in ('dt', 'dx', 'dy')}
+    per_sample = {name: [] for name in ('distance', 'canvas', 'points', 'duration', 'end_error')}
+    num_steps = 0
+    num_skipped = 0
+
+    for distance, canvas, offsets, points, skipped in batches:
+        num_skipped += skipped
+        lengths = np.diff(offsets)
+        nonempty = lengths > 0
+        starts = offsets[:-1][nonempty]
+        ends = offsets[1:][nonempty]
+
+        points = np.asarray(points)
+        a = points[:, 0].astype(np.int64)
+        b = points[:, 1].astype(np.int64)
+        c = points[:, 2].astype(np.int64)
+
+        # 每个样本的总时长（c 为相邻点的时间间隔）和终点误差
+        duration = np.add.reduceat(c, starts) if len(starts) else np.zeros(0, dtype=np.int64)
+        end_error = a[ends - 1] - distance[nonempty]
+
+        per_sample['distance'].append(np.asarray(distance)[nonempty])
+        per_sample['canvas'].append(np.asarray(canvas)[nonempty])
+        per_sample['points'].append(lengths[nonempty])
+        per_sample['duration'].append(duration)
+        per_sample['end_error'].append(end_error)
+
+        # 每一步：去掉每个样本的第一个点（没有前驱）
+        step_mask = np.ones(len(a), dtype=bool)
+        step_mask[starts] = False
+        step_mask = step_mask[1:]
+        steps = {
+            'dt': c[1:][step_mask],
+            'dx': np.diff(a)[step_mask],
+            'dy': np.diff(b)[step_mask],
+        }
+        num_steps += int(step_mask.sum())
+
+        for name, values in steps.items():
+            step_hists[name].add(values)
+            step_moments[name].add(values)
+
+    per_sample = {
+        name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+        for name, chunks in per_sample.items()
+    }
+
+    point_hist = HistogramAccumulator(*HISTOGRAM_RANGES['points'])
+    point_hist.add(per_sample['points'])
+    duration_hist = HistogramAccumulator(*HISTOGRAM_RANGES['duration'])
+    duration_hist.add(per_sample['duration'])
+
+    # 按目标距离分桶
+    buckets = []
+    if len(per_sample['distance']):
+        bucket_ids = per_sample['distance'] // bucket_size
+        order = np.argsort(bucket_ids, kind='stable')
+        sorted_ids = bucket_ids[order]
+        unique_ids, first = np.unique(sorted_ids, return_index=True)
+        bounds = np.append(first, len(sorted_ids))
+        for bucket_id, lo, hi in zip(unique_ids, bounds[:-1], bounds[1:]):
+            index = order[lo:hi]
+            buckets.append({
+                'distance_min': int(bucket_id * bucket_size),
+                'distance_max': int((bucket_id + 1) * bucket_size),
+                'samples': int(hi - lo),
+                'points': _summary(per_sample['points'][index]),
+                'duration': _summary(per_sample['duration'][index]),
+                'end_error': _summary(per_sample['end_error'][index]),
+            })
+
+    return {
+        'num_samples': int(len(per_sample['distance'])),
+        'num_steps': num_steps,
+        'num_skipped': num_skipped,
+        'samples': {
+            'distance': _summary(per_sample['distance']),
+            'canvas': _summary(per_sample['canvas']),
+            'points': _summary(per_sample['points']),
+            'duration': _summary(per_sample['duration']),
+            'end_error': _summary(per_sample['end_error']),
+        },
+        'steps': {name: moments.to_dict() for name, moments in step_moments.items()},
+        'histograms': {
+            'points': point_hist.to_dict(),
+            'duration': duration_hist.to_dict(),
+            **{name: hist.to_dict() for name, hist in step_hists.items()},
+        },
+        'distance_buckets': buckets,
+    }
+
+
+def write_csv(stats: Dict[str, Any], output_path: Path) -> None:
+    """
+    以 CSV 格式写出统计结果
+
+    每行: section, name, lo, hi, count, mean, p50, p90
+    """
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['section', 'name', 'lo', 'hi', 'count', 'mean', 'p50', 'p90'])
+
+        for name, summary in stats['samples'].items():
+            writer.writerow(['sample', name, summary.get('min'), summary.get('max'), summary['count'],
+                             summary.get('mean'), summary.get('p50'), summary.get('p90')])
+
+        for name, hist in stats['histograms'].items():
+            edges = hist['edges']
+            for lo, hi, count in zip(edges[:-1], edges[1:], hist['counts']):
+                writer.writerow(['histogram', name, lo, hi, count, '', '', ''])
+
+        for bucket in stats['distance_buckets']:
+            for name in ('points', 'duration', 'end_error'):
+                summary = bucket[name]
+                writer.writerow(['distance_bucket', name, bucket['distance_min'], bucket['distance_max'],
+                                 bucket['samples'], summary.get('mean'), summary.get('p50'), summary.get('p90')])
+
+
+def print_stats(stats: Dict[str, Any]) -> None:
+    """打印统计摘要"""
+    print("📊 数据集统计:")
+    print(f"   样本数: {stats['num_samples']}，步数: {stats['num_steps']}")
+    if stats['num_skipped']:
+        print(f"   ⚠️  格式错误已跳过: {stats['num_skipped']}")
+    for name, label in (('points', '点数'), ('duration', '总时长(ms)'), ('end_error', '终点误差(px)')):
+        s = stats['samples'][name]
+        if s['count']:
+            print(f"   {label}: 均值 {s['mean']}，P50 {s['p50']}，P90 {s['p90']}，范围 {s['min']}-{s['max']}")
+
+    if stats['distance_buckets']:
+        print()
+        print("📏 按目标距离分桶:")
+        print(f"   {'距离':>10}  {'样本数':>8}  {'平均点数':>8}  {'平均时长':>8}")
+        for bucket in stats['distance_buckets']:
+            print(
+                f"   {bucket['distance_min']:>4}-{bucket['distance_max']:<5}  {bucket['samples']:>8}  "
+                f"{bucket['points']['mean']:>8}  {bucket['duration']['mean']:>8}"
+            )
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='轨迹数据集统计（NumPy 向量化）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+示例:
+  # 统计训练数据，输出 JSON 报告
+  python dataset_stats.py --input training_data.jsonl --output stats.json
+
+  # 统计标注目录，输出 CSV 报告
+  python dataset_stats.py --input captcha_dataset/metadata --output stats.csv --workers 8
+
+  # 统计列式存储（最快）
+  python dataset_stats.py --input captcha_dataset/trajectory_store --bucket_size 10
+        """
+    )
+
+    parser.add_argument(
+        '--input',
+        type=str,
+        required=True,
+        help='训练数据 JSONL、标注数据目录或轨迹列式存储目录'
+    )
+
+    parser.add_argument(
+        '--output',
+        type=str,
+        default=None,
+        help='报告输出路径（.json 或 .csv），不指定则只打印摘要'
+    )
+
+    parser.add_argument(
+        '--format',
+        choices=['json', 'csv'],
+        default=None,
+        help='报告格式，默认根据输出文件扩展名判断'
+    )
+
+    parser.add_argument(
+        '--bucket_size',
+        type=int,
+        default=20,
+        help='目标距离分桶宽度（像素），默认20'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='解析 JSONL 或读取标注目录时的并行进程数，默认1'
+    )
+
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"❌ 错误: 输入不存在: {args.input}")
+        return
+
+    print(f"📂 输入: {args.input}")
+    start = time.time()
+    stats = compute_stats(iter_batches(input_path, workers=args.workers), bucket_size=args.bucket_size)
+    print(f"⏱️  耗时: {time.time() - start:.2f}s")
+    print()
+    print_stats(stats)
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        fmt = args.format or ('csv' if output_path.suffix.lower() == '.csv' else 'json')
+        if fmt == 'csv':
+            write_csv(stats, output_path)
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, ensure_ascii=False, indent=2)
+        print()
+        print(f"✅ 报告已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
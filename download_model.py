@@ -1,21 +1,45 @@
 #!/usr/bin/env python3
 """
 自动下载预训练模型脚本
-从 GitHub Releases 下载最新的模型并解压到 models/final_model 目录
+从 GitHub Releases 下载最新的模型，安装到本地模型版本库（models/store，见 model_store.py）并设为当前版本
+
+下载支持断点续传（HTTP Range）、多连接并行下载、SHA-256 校验，并在下载过程中同步解压
+
+使用方法:
+    python download_model.py
+    python download_model.py --connections 8
+    python download_model.py --connections 1 --sha256 <摘要>
 """
 
 import os
 import sys
+import time
+import zlib
+import struct
+import hashlib
 import zipfile
 import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from http.client import HTTPException
 from urllib.request import urlopen, Request
 import json
 
+from model_store import install_version, list_versions, set_current, version_path
+
 # GitHub 仓库信息
 REPO_OWNER = "wilinz"
 REPO_NAME = "slider_captcha_trajectory_gen"
-MODEL_DIR = Path(__file__).parent / "models" / "final_model"
+
+# 下载参数
+DEFAULT_CONNECTIONS = 4
+MIN_PARALLEL_SIZE = 8 * 1024 * 1024  # 小于该大小的文件只用一个连接
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+MAX_RETRIES = 5
+TIMEOUT = 30
 
 
 def get_latest_release():
@@ -54,46 +78,562 @@ def find_model_asset(release_data):
     return None
 
 
-def download_file(url, filename):
-    """下载文件并显示进度"""
-    print(f"📥 正在下载: {filename}")
-    print(f"📍 URL: {url}")
+class ProgressBar:
+    """线程安全的下载进度条"""
+
+    def __init__(self, total_size, downloaded=0):
+        self.total_size = total_size
+        self.downloaded = downloaded
+        self.lock = threading.Lock()
+        self.last_print = 0.0
+
+    def update(self, n):
+        with self.lock:
+            self.downloaded += n
+            now = time.monotonic()
+            if now - self.last_print < 0.1:
+                return
+            self.last_print = now
+            self._print()
+
+    def finish(self):
+        with self.lock:
+            self._print()
+        print()  # 换行
+
+    def _print(self):
+        downloaded = self.downloaded
+        total_size = self.total_size
+        if total_size:
+            percent = (downloaded / total_size) * 100
+            bar_length = 40
+            filled = int(bar_length * downloaded / total_size)
+            bar = '█' * filled + '░' * (bar_length - filled)
+            print(f'\r  进度: [{bar}] {percent:.1f}% ({downloaded}/{total_size} bytes)', end='', flush=True)
+        else:
+            print(f'\r  已下载: {downloaded} bytes', end='', flush=True)
 
-    try:
-        req = Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0')
-        req.add_header('Accept', 'application/octet-stream')
 
-        with urlopen(req) as response:
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 8192
-            downloaded = 0
-
-            with open(filename, 'wb') as f:
-                while True:
-                    buffer = response.read(block_size)
-                    if not buffer:
-                        break
-
-                    downloaded += len(buffer)
-                    f.write(buffer)
-
-                    # 显示进度
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        bar_length = 40
-                        filled = int(bar_length * downloaded / total_size)
-                        bar = '█' * filled + '░' * (bar_length - filled)
-                        print(f'\r  进度: [{bar}] {percent:.1f}% ({downloaded}/{total_size} bytes)', end='')
-                    else:
-                        print(f'\r  已下载: {downloaded} bytes', end='')
+class StreamingZipExtractor:
+    """
+    边下载边解压 zip（按本地文件头顺序解析，不需要等待文件末尾的中央目录）
 
-            print()  # 换行
+    支持 STORED 和 DEFLATED 两种压缩方式；带数据描述符的 STORED 条目无法流式确定长度，
+    此时抛出 zipfile.BadZipFile，由调用方在下载完成后改用 zipfile 解压
+    """
+
+    LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+    LOCAL_HEADER_SIG = 0x04034b50
+    CENTRAL_DIR_SIG = 0x02014b50
+    DESCRIPTOR_SIG = 0x08074b50
+
+    def __init__(self, extract_to):
+        self.extract_to = Path(extract_to).resolve()
+        self.buffer = bytearray()
+        self.files = []
+        self.done = False
+        self._entry = None
+
+    def feed(self, data):
+        """送入下一段 zip 字节流"""
+        if self.done:
+            return
+        self.buffer += data
+        while not self.done and self._step():
+            pass
+
+    def close(self):
+        """数据结束，检查 zip 是否完整"""
+        if not self.done:
+            raise zipfile.BadZipFile("zip 数据不完整")
+
+    def _target_path(self, name):
+        path = (self.extract_to / name).resolve()
+        if path != self.extract_to and self.extract_to not in path.parents:
+            raise zipfile.BadZipFile(f"非法的文件路径: {name}")
+        return path
+
+    def _step(self):
+        """处理缓冲区中的数据，返回是否还能继续处理"""
+        if self._entry is None:
+            return self._read_header()
+        if self._entry['state'] == 'data':
+            return self._read_data()
+        return self._read_descriptor()
+
+    def _read_header(self):
+        if len(self.buffer) < 4:
+            return False
+        sig = struct.unpack_from('<I', self.buffer)[0]
+        if sig == self.CENTRAL_DIR_SIG:
+            # 所有条目都已解压，剩下的是中央目录
+            self.done = True
+            return False
+        if sig != self.LOCAL_HEADER_SIG:
+            raise zipfile.BadZipFile(f"无效的本地文件头: {sig:#x}")
+        if len(self.buffer) < self.LOCAL_HEADER.size:
+            return False
+
+        (_, _, flags, method, _, _, crc, csize, usize, name_len, extra_len) = \
+            self.LOCAL_HEADER.unpack_from(self.buffer)
+        header_len = self.LOCAL_HEADER.size + name_len + extra_len
+        if len(self.buffer) < header_len:
+            return False
+
+        name_bytes = bytes(self.buffer[self.LOCAL_HEADER.size:self.LOCAL_HEADER.size + name_len])
+        name = name_bytes.decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = bytes(self.buffer[self.LOCAL_HEADER.size + name_len:header_len])
+        del self.buffer[:header_len]
+
+        # ZIP64: 大小字段为 0xFFFFFFFF 时，真实值在 extra 字段中
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            field_id, field_len = struct.unpack_from('<HH', extra, pos)
+            if field_id == 0x0001:
+                zip64 = True
+                values = iter(struct.unpack_from(f'<{field_len // 8}Q', extra, pos + 4))
+                if usize == 0xFFFFFFFF:
+                    usize = next(values)
+                if csize == 0xFFFFFFFF:
+                    csize = next(values)
+            pos += 4 + field_len
+
+        has_descriptor = bool(flags & 0x08)
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"不支持的压缩方式: {method}")
+        if method == zipfile.ZIP_STORED and has_descriptor:
+            raise zipfile.BadZipFile("无法流式解压带数据描述符的 STORED 条目")
+
+        path = self._target_path(name)
+        if name.endswith('/'):
+            path.mkdir(parents=True, exist_ok=True)
+            out = None
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            out = open(path, 'wb')
+            self.files.append(name)
+
+        self._entry = {
+            'state': 'data',
+            'name': name,
+            'out': out,
+            'method': method,
+            'crc': crc,
+            'remaining': None if has_descriptor else csize,
+            'has_descriptor': has_descriptor,
+            'zip64': zip64,
+            'actual_crc': 0,
+            'decompressor': zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None,
+        }
+        return True
+
+    def _write(self, data):
+        entry = self._entry
+        entry['actual_crc'] = zlib.crc32(data, entry['actual_crc'])
+        if entry['out']:
+            entry['out'].write(data)
+
+    def _read_data(self):
+        entry = self._entry
+        if not self.buffer:
+            return False
+
+        if entry['remaining'] is not None:
+            chunk = bytes(self.buffer[:entry['remaining']])
+            del self.buffer[:len(chunk)]
+            entry['remaining'] -= len(chunk)
+        else:
+            chunk = bytes(self.buffer)
+            self.buffer.clear()
+
+        if entry['decompressor']:
+            self._write(entry['decompressor'].decompress(chunk))
+            if entry['decompressor'].eof:
+                # 压缩流已结束，多读的字节属于下一部分
+                self.buffer[:0] = entry['decompressor'].unused_data
+                entry['remaining'] = 0
+        else:
+            self._write(chunk)
+
+        if entry['remaining'] != 0:
+            return bool(self.buffer)
+
+        if entry['has_descriptor']:
+            entry['state'] = 'descriptor'
             return True
+        return self._finish_entry(entry['crc'])
+
+    def _read_descriptor(self):
+        entry = self._entry
+        size_len = 8 if entry['zip64'] else 4
+        if len(self.buffer) < 4:
+            return False
+        offset = 4 if struct.unpack_from('<I', self.buffer)[0] == self.DESCRIPTOR_SIG else 0
+        total = offset + 4 + 2 * size_len
+        if len(self.buffer) < total:
+            return False
+        crc = struct.unpack_from('<I', self.buffer, offset)[0]
+        del self.buffer[:total]
+        return self._finish_entry(crc)
+
+    def _finish_entry(self, expected_crc):
+        entry = self._entry
+        if entry['out']:
+            entry['out'].close()
+        if not entry['name'].endswith('/') and entry['actual_crc'] != expected_crc:
+            raise zipfile.BadZipFile(f"CRC 校验失败: {entry['name']}")
+        self._entry = None
+        return True
+
+
+def _open_url(url, start=None, end=None, validators=None):
+    """
+    发起 GET 请求，可选 Range（end 为包含的最后一个字节）
+
+    指定 validators 时附带 If-Range：服务器上的文件已变化时返回 200 和完整内容，而不是 206
+    """
+    req = Request(url)
+    req.add_header('User-Agent', 'Mozilla/5.0')
+    req.add_header('Accept', 'application/octet-stream')
+    if start is not None:
+        req.add_header('Range', f'bytes={start}-' if end is None else f'bytes={start}-{end}')
+        if_range = _if_range(validators)
+        if if_range:
+            req.add_header('If-Range', if_range)
+    return urlopen(req, timeout=TIMEOUT)
+
+
+def _if_range(validators):
+    """If-Range 只能使用强 ETag 或 Last-Modified"""
+    if not validators:
+        return None
+    etag = validators.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validators.get('last_modified')
+
+
+def _iter_response(response):
+    """
+    以自适应大小的缓冲区读取响应
+
+    读满一个缓冲区很快时加倍（减少系统调用），读得很慢时减半（保持进度刷新和超时重试的粒度）
+    """
+    block_size = MIN_BLOCK_SIZE
+    while True:
+        start = time.monotonic()
+        buffer = response.read(block_size)
+        if not buffer:
+            return
+        yield buffer
+
+        elapsed = time.monotonic() - start
+        if len(buffer) == block_size and elapsed < 0.1:
+            block_size = min(block_size * 2, MAX_BLOCK_SIZE)
+        elif elapsed > 1.0:
+            block_size = max(block_size // 2, MIN_BLOCK_SIZE)
+
+
+def probe_download(url):
+    """
+    探测文件大小、服务器是否支持 Range 请求，以及用于识别文件版本的 ETag / Last-Modified
+
+    Returns:
+        (文件大小或None, 是否支持Range, {'etag': ..., 'last_modified': ...})
+    """
+    with _open_url(url, 0, 0) as response:
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        content_range = response.headers.get('Content-Range', '')
+        if response.status == 206 and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            return (int(total) if total.isdigit() else None), True, validators
+        length = response.headers.get('Content-Length')
+        return (int(length) if length else None), False, validators
+
+
+def _download_range(url, fd, chunk, progress, state_lock, stop, validators=None):
+    """
+    下载一个字节区间（在线程中运行），chunk = [start, end, done]，失败时自动重试
+
+    stop 被设置时（例如主线程收到 Ctrl+C）在下一个缓冲区之前返回
+    """
+    for attempt in range(MAX_RETRIES):
+        start, end, done = chunk
+        if start + done > end or stop.is_set():
+            return
+        try:
+            with _open_url(url, start + done, end, validators) as response:
+                if response.status != 206:
+                    raise OSError(f"服务器未返回分段内容 (HTTP {response.status})，文件可能已变化")
+                for buffer in _iter_response(response):
+                    if stop.is_set():
+                        return
+                    buffer = buffer[:end + 1 - (start + chunk[2])]
+                    os.pwrite(fd, buffer, start + chunk[2])
+                    with state_lock:
+                        chunk[2] += len(buffer)
+                    progress.update(len(buffer))
+            if start + chunk[2] > end:
+                return
+        except (OSError, HTTPException) as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            print(f"\n⚠️  分段 {start}-{end} 下载中断，正在重试: {e}")
+            time.sleep(min(2 ** attempt, 10))
+    raise OSError(f"分段 {chunk[0]}-{chunk[1]} 未能下载完整")
+
+
+def _load_state(state_path, part_path, identity):
+    """
+    读取断点信息，与当前要下载的文件（url、大小、ETag/Last-Modified、下载方式）不一致时删除旧的断点文件
+
+    同名的 release 附件（如 final_model.zip）在不同版本间会重复，不能只凭文件名续传
+    """
+    state = None
+    if state_path.exists() and part_path.exists():
+        try:
+            state = json.loads(state_path.read_text())
+        except ValueError:
+            state = None
+    if state is not None and all(state.get(key) == value for key, value in identity.items()):
+        return state
+
+    if part_path.exists():
+        print("  🗑️  已有的断点文件与服务器上的文件不一致，重新下载")
+        part_path.unlink()
+    if state_path.exists():
+        state_path.unlink()
+    return None
+
+
+def _save_state(state_path, state, state_lock):
+    with state_lock:
+        data = json.dumps(state)
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    tmp_path.write_text(data)
+    os.replace(tmp_path, state_path)
+
+
+def _download_parallel(url, part_path, total_size, connections, consume, progress, validators=None):
+    """
+    多连接分段下载到 part_path，同时按顺序把已连续下载的前缀交给 consume
+
+    分段进度保存在 {part_path}.json，中断后重新运行会从各分段的断点继续
+    """
+    state_path = part_path.with_name(part_path.name + '.json')
+    identity = {'mode': 'parallel', 'url': url, 'total': total_size, **(validators or {})}
+    state = _load_state(state_path, part_path, identity)
+
+    if state is None:
+        chunk_size = -(-total_size // connections)
+        state = dict(
+            identity,
+            chunks=[[s, min(s + chunk_size, total_size) - 1, 0] for s in range(0, total_size, chunk_size)]
+        )
+        with open(part_path, 'wb') as f:
+            f.truncate(total_size)
+
+    progress.downloaded = sum(c[2] for c in state['chunks'])
+    state_lock = threading.Lock()
+    fd = os.open(part_path, os.O_RDWR)
+    consumed = 0
+
+    def contiguous_prefix():
+        with state_lock:
+            prefix = 0
+            for start, end, done in state['chunks']:
+                prefix = start + done
+                if start + done <= end:
+                    break
+            return prefix
+
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=connections)
+    futures = []
+    try:
+        futures = [
+            executor.submit(_download_range, url, fd, chunk, progress, state_lock, stop, validators)
+            for chunk in state['chunks']
+        ]
+        last_save = time.monotonic()
+        while True:
+            finished = all(f.done() for f in futures)
+            prefix = contiguous_prefix()
+            while consumed < prefix:
+                # 用 pread 直接读取：带缓冲的读取会预读到前缀之后，缓存尚未写入的空洞
+                data = os.pread(fd, min(prefix - consumed, MAX_BLOCK_SIZE), consumed)
+                consume(data)
+                consumed += len(data)
+            if time.monotonic() - last_save > 1.0:
+                _save_state(state_path, state, state_lock)
+                last_save = time.monotonic()
+            if finished:
+                break
+            time.sleep(0.05)
+        for f in futures:
+            f.result()
+    except BaseException:
+        # Ctrl+C 或某个分段失败：通知其他分段停止，不再等它们下载完
+        # （逐个 cancel 而不是 shutdown(cancel_futures=True)，后者需要 Python 3.9）
+        stop.set()
+        for f in futures:
+            f.cancel()
+        raise
+    finally:
+        # 等分段线程退出后再关闭 fd，避免写入已关闭（或被复用）的文件描述符
+        executor.shutdown(wait=True)
+        os.close(fd)
+        _save_state(state_path, state, state_lock)
+
+    if consumed != total_size:
+        raise OSError(f"下载不完整 ({consumed}/{total_size} bytes)")
+    state_path.unlink()
+
+
+def _download_single(url, part_path, total_size, supports_range, consume, progress, validators=None):
+    """
+    单连接下载到 part_path，支持 Range 的服务器在中断后从断点续传
+
+    断点文件的来源（url、大小、ETag/Last-Modified）记录在 {part_path}.json，不一致时重新下载
+    """
+    state_path = part_path.with_name(part_path.name + '.json')
+    identity = {'mode': 'single', 'url': url, 'total': total_size, **(validators or {})}
+    state = _load_state(state_path, part_path, identity) if supports_range else None
+    if state is not None and total_size is not None and part_path.stat().st_size > total_size:
+        print("  🗑️  断点文件比服务器上的文件还大，重新下载")
+        part_path.unlink()
+        state = None
+    if state is None:
+        if part_path.exists():
+            part_path.unlink()
+        _save_state(state_path, identity, threading.Lock())
+
+    downloaded = 0
+    if part_path.exists():
+        # 续传：先把已下载的部分交给 consume，再请求剩余部分
+        with open(part_path, 'rb') as f:
+            for buffer in iter(lambda: f.read(MAX_BLOCK_SIZE), b''):
+                consume(buffer)
+                downloaded += len(buffer)
+        if downloaded:
+            print(f"  ↪️  从断点续传: {downloaded} bytes")
+    progress.downloaded = downloaded
+
+    with open(part_path, 'ab' if downloaded else 'wb') as f:
+        for attempt in range(MAX_RETRIES):
+            if total_size is not None and downloaded >= total_size:
+                break
+            try:
+                start = downloaded if downloaded and supports_range else None
+                with _open_url(url, start, validators=validators) as response:
+                    if start is not None and response.status != 206:
+                        # If-Range 不匹配：服务器上的文件已变化，已下载的部分不能再用
+                        f.close()
+                        part_path.unlink()
+                        state_path.unlink()
+                        raise RuntimeError("服务器上的文件已变化，已删除断点文件，请重新运行")
+                    for buffer in _iter_response(response):
+                        f.write(buffer)
+                        consume(buffer)
+                        downloaded += len(buffer)
+                        progress.update(len(buffer))
+                if total_size is None or downloaded >= total_size:
+                    break
+                print(f"\n⚠️  连接提前关闭，正在从 {downloaded} bytes 处续传")
+            except (OSError, HTTPException) as e:
+                if not supports_range or attempt == MAX_RETRIES - 1:
+                    raise
+                f.flush()
+                print(f"\n⚠️  下载中断，正在从 {downloaded} bytes 处续传: {e}")
+                time.sleep(min(2 ** attempt, 10))
+
+    if total_size is not None and downloaded != total_size:
+        raise OSError(f"下载不完整 ({downloaded}/{total_size} bytes)")
+    state_path.unlink()
+
+
+def download_file(url, filename, expected_size=None, sha256=None, connections=DEFAULT_CONNECTIONS, extract_to=None):
+    """
+    下载文件并显示进度
+
+    - 先写入 {filename}.part，中断后重新运行会用 HTTP Range 从断点续传
+    - 服务器支持 Range 且文件较大时，使用 connections 个连接并行下载不同分段
+    - 下载过程中按顺序计算 SHA-256，并在指定 extract_to 时边下载边解压 zip
+    - 下载完成且校验通过后，.part 重命名为 filename
+
+    Args:
+        url: 下载地址
+        filename: 保存路径
+        expected_size: 预期文件大小（字节），None 表示以服务器返回为准
+        sha256: 预期的 SHA-256（十六进制），None 表示不校验
+        connections: 最大并行连接数
+        extract_to: 边下载边解压的目标目录，None 表示不解压
+
+    Returns:
+        (是否成功, 是否已解压)
+    """
+    print(f"📥 正在下载: {filename}")
+    print(f"📍 URL: {url}")
+
+    filename = Path(filename)
+    part_path = filename.with_name(filename.name + '.part')
+
+    try:
+        total_size, supports_range, validators = probe_download(url)
+        if expected_size and total_size and expected_size != total_size:
+            print(f"⚠️  服务器返回的大小 ({total_size}) 与预期 ({expected_size}) 不一致")
+        total_size = total_size or expected_size
+
+        hasher = hashlib.sha256()
+        extractor = StreamingZipExtractor(extract_to) if extract_to else None
+
+        def consume(data):
+            nonlocal extractor
+            hasher.update(data)
+            if extractor is not None:
+                try:
+                    extractor.feed(data)
+                except zipfile.BadZipFile as e:
+                    # 无法流式解压时，下载完成后再整体解压
+                    print(f"\n⚠️  无法边下载边解压，将在下载完成后解压: {e}")
+                    extractor = None
+
+        progress = ProgressBar(total_size)
+        if supports_range and total_size and connections > 1 and total_size >= MIN_PARALLEL_SIZE:
+            print(f"  🔀 并行连接: {connections}")
+            _download_parallel(url, part_path, total_size, connections, consume, progress, validators)
+        else:
+            _download_single(url, part_path, total_size, supports_range, consume, progress, validators)
+        progress.finish()
+
+        if sha256:
+            actual = hasher.hexdigest()
+            if actual.lower() != sha256.lower():
+                print(f"❌ SHA-256 校验失败: 期望 {sha256}，实际 {actual}")
+                part_path.unlink()
+                return False, False
+            print("  ✅ SHA-256 校验通过")
+
+        extracted = False
+        if extractor is not None:
+            try:
+                extractor.close()
+                extracted = True
+            except zipfile.BadZipFile as e:
+                print(f"⚠️  流式解压未完成，将在下载完成后解压: {e}")
+
+        os.replace(part_path, filename)
+        return True, extracted
 
     except Exception as e:
         print(f"\n❌ 下载失败: {e}")
-        return False
+        if part_path.exists():
+            print(f"💡 已下载的部分保存在 {part_path}，重新运行将从断点续传")
+        return False, False
 
 
 def extract_zip(zip_path, extract_to):
@@ -122,23 +662,32 @@ def extract_zip(zip_path, extract_to):
 
 
 def main():
+    parser = argparse.ArgumentParser(description='从 GitHub Releases 下载预训练模型')
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help=f'并行下载连接数，默认{DEFAULT_CONNECTIONS}（1 为单连接）'
+    )
+    parser.add_argument(
+        '--sha256',
+        type=str,
+        default=None,
+        help='模型文件的 SHA-256，默认使用 release 中提供的摘要（如有）'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='最新版本已安装时也重新下载'
+    )
+    args = parser.parse_args()
+
     print("=" * 70)
     print("🤖 滑块轨迹生成模型自动下载工具")
     print("=" * 70)
     print()
 
-    # 1. 检查模型目录是否已存在
-    if MODEL_DIR.exists():
-        print(f"⚠️  模型目录已存在: {MODEL_DIR}")
-        response = input("是否要删除并重新下载？(y/N): ").strip().lower()
-        if response == 'y':
-            print("🗑️  正在删除旧模型...")
-            shutil.rmtree(MODEL_DIR)
-        else:
-            print("❌ 取消下载")
-            return
-
-    # 2. 获取最新 release
+    # 1. 获取最新 release
     release_data = get_latest_release()
     if not release_data:
         print("❌ 无法获取 release 信息")
@@ -151,6 +700,15 @@ def main():
     print(f"📝 发布说明: {release_data.get('name', 'N/A')}")
     print()
 
+    # 2. 检查该版本是否已在本地版本库中
+    installed = [meta for meta in list_versions() if meta.get('tag') == version]
+    if installed and not args.force:
+        set_current(installed[0]['version'])
+        print(f"✅ 版本 {version} 已安装 ({installed[0]['version']})，已设为当前版本")
+        print(f"📂 模型目录: {version_path(installed[0]['version'])}")
+        print("💡 如需重新下载，请使用 --force")
+        return
+
     # 3. 查找模型文件
     asset = find_model_asset(release_data)
     if not asset:
@@ -162,29 +720,47 @@ def main():
     filename = asset['name']
     file_size = asset['size']
 
+    # GitHub 会在 asset 中提供 "sha256:..." 格式的摘要
+    sha256 = args.sha256
+    digest = asset.get('digest') or ''
+    if not sha256 and digest.startswith('sha256:'):
+        sha256 = digest.split(':', 1)[1]
+
     print(f"📦 模型文件: {filename}")
     print(f"📊 文件大小: {file_size / (1024*1024):.2f} MB")
     print()
 
-    # 4. 下载文件
+    # 4. 下载文件（边下载边解压）
     temp_dir = Path(__file__).parent / "temp_download"
     temp_dir.mkdir(exist_ok=True)
     zip_path = temp_dir / filename
-
-    if not download_file(download_url, zip_path):
+    extract_temp = temp_dir / "extracted"
+    # 流式解压在 SHA-256 校验之前就写出文件，上次失败的运行可能留下不完整或过期的文件
+    shutil.rmtree(extract_temp, ignore_errors=True)
+    extract_temp.mkdir()
+
+    success, extracted = download_file(
+        download_url,
+        zip_path,
+        expected_size=file_size,
+        sha256=sha256,
+        connections=args.connections,
+        extract_to=extract_temp
+    )
+    if not success:
         print("❌ 下载失败")
         return
 
     print("✅ 下载完成")
     print()
 
-    # 5. 解压文件
-    extract_temp = temp_dir / "extracted"
-    extract_temp.mkdir(exist_ok=True)
-
-    if not extract_zip(zip_path, extract_temp):
-        print("❌ 解压失败")
-        return
+    # 5. 解压文件（无法流式解压时）
+    if not extracted:
+        shutil.rmtree(extract_temp)
+        extract_temp.mkdir()
+        if not extract_zip(zip_path, extract_temp):
+            print("❌ 解压失败")
+            return
 
     print("✅ 解压完成")
     print()
@@ -210,13 +786,11 @@ def main():
     if not source_dir:
         source_dir = model_files[0].parent
 
-    # 创建目标目录
-    MODEL_DIR.parent.mkdir(parents=True, exist_ok=True)
-
-    # 移动文件
-    shutil.move(str(source_dir), str(MODEL_DIR))
+    # 先以未激活状态安装到版本库（复制到临时目录后原子 rename）
+    model_version = install_version(source_dir, info={'tag': version, 'asset': filename}, activate=False)
+    installed_dir = version_path(model_version)
 
-    print(f"✅ 模型已安装到: {MODEL_DIR}")
+    print(f"✅ 模型已安装到: {installed_dir}")
     print()
 
     # 7. 清理临时文件
@@ -231,7 +805,7 @@ def main():
     all_present = True
 
     for required_file in required_files:
-        file_path = MODEL_DIR / required_file
+        file_path = installed_dir / required_file
         if file_path.exists():
             print(f"  ✅ {required_file}")
         else:
@@ -241,6 +815,10 @@ def main():
     print()
 
     if all_present:
+        # 9. 原子地切换当前版本（已运行的生成器可调用 reload() 热加载）
+        set_current(model_version)
+        print(f"📌 当前版本: {model_version}")
+        print()
         print("=" * 70)
         print("🎉 模型安装成功！")
         print("=" * 70)
@@ -250,7 +828,7 @@ def main():
         print("  2. 查看文档: README.md")
         print()
     else:
-        print("⚠️  模型可能未完全安装，请检查文件")
+        print("⚠️  模型可能未完全安装，请检查文件（未切换当前版本）")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+分片 JSONL 训练数据（带字节偏移索引，支持 O(1) 随机访问）
+
+目录结构（以 --output_file training_data.jsonl 为例）:
+    training_data.shards.json          # 分片清单：每个划分的分片文件、样本数、字节数
+    training_data-train-00000.jsonl    # 训练集分片（每个分片大小有上限）
+    training_data-train-00000.idx      # int64 小端，行起始偏移，共 (行数 + 1) 个，最后一个为文件大小
+    training_data-eval-00000.jsonl     # 验证集分片
+    training_data-eval-00000.idx
+
+使用方法:
+    from jsonl_shards import ShardedJsonlReader
+
+    reader = ShardedJsonlReader("training_data.shards.json", split="train")
+    print(len(reader), reader[123])
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+SHARDS_VERSION = 1
+
+OFFSET_FORMAT = '<q'
+OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+
+
+def shards_manifest_path(output_path: Union[str, Path]) -> Path:
+    """分片清单路径: training_data.jsonl -> training_data.shards.json"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + '.shards.json')
+
+
+def split_for_id(sample_id: str, eval_ratio: float) -> str:
+    """
+    根据 id 的哈希值确定样本属于 train 还是 eval
+
+    同一个 id 无论处理顺序、数据集大小如何变化，划分结果都不变
+    """
+    if eval_ratio <= 0:
+        return 'train'
+    digest = hashlib.blake2b(str(sample_id).encode('utf-8'), digest_size=8).digest()
+    bucket = int.from_bytes(digest, 'little') / 2 ** 64
+    return 'eval' if bucket < eval_ratio else 'train'
+
+
+def remove_shards(output_path: Union[str, Path]) -> bool:
+    """
+    删除 output_path 对应的分片清单及其分片文件
+
+    Returns:
+        是否存在并删除了分片
+    """
+    manifest_path = shards_manifest_path(output_path)
+    if not manifest_path.exists():
+        return False
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+    manifest_path.unlink()
+    for shards in old.get('splits', {}).values():
+        for shard in shards:
+            for name in (shard['file'], shard['index']):
+                path = manifest_path.with_name(name)
+                if path.exists():
+                    path.unlink()
+    return True
+
+
+class _SplitWriter:
+    """单个划分（train/eval）的分片写入器"""
+
+    def __init__(self, output_path: Path, split: str, max_shard_bytes: Optional[int]):
+        self.output_path = output_path
+        self.split = split
+        self.max_shard_bytes = max_shard_bytes
+        self.shards: List[Dict[str, Any]] = []
+        self._data_f = None
+        self._index_f = None
+        self._shard_bytes = 0
+        self._shard_samples = 0
+
+    def _open_shard(self) -> None:
+        base = f"{self.output_path.stem}-{self.split}-{len(self.shards):05d}"
+        data_path = self.output_path.with_name(base + '.jsonl')
+        index_path = self.output_path.with_name(base + '.idx')
+        self._data_f = open(data_path, 'wb')
+        self._index_f = open(index_path, 'wb')
+        self._index_f.write(struct.pack(OFFSET_FORMAT, 0))
+        self._shard_bytes = 0
+        self._shard_samples = 0
+        self.shards.append({'file': data_path.name, 'index': index_path.name})
+
+    def _close_shard(self) -> None:
+        if self._data_f is None:
+            return
+        self._data_f.close()
+        self._index_f.close()
+        self.shards[-1].update(num_samples=self._shard_samples, bytes=self._shard_bytes)
+        self._data_f = None
+        self._index_f = None
+
+    def write(self, line: str) -> None:
+        data = (line + '\n').encode('utf-8')
+
+        # 当前分片写满时切换到新分片（空分片至少写入一行，避免超长样本导致死循环）
+        if self._data_f is not None and self.max_shard_bytes and self._shard_samples > 0 \
+                and self._shard_bytes + len(data) > self.max_shard_bytes:
+            self._close_shard()
+        if self._data_f is None:
+            self._open_shard()
+
+        self._data_f.write(data)
+        self._shard_bytes += len(data)
+        self._shard_samples += 1
+        self._index_f.write(struct.pack(OFFSET_FORMAT, self._shard_bytes))
+
+    def close(self) -> None:
+        self._close_shard()
+
+
+class ShardedJsonlWriter:
+    """
+    按 train/eval 划分写入大小受限的 JSONL 分片，并生成字节偏移索引
+
+    用法:
+        with ShardedJsonlWriter("training_data.jsonl", max_shard_bytes=64 << 20, eval_ratio=0.1) as writer:
+            writer.write(sample_id, line)
+    """
+
+    def __init__(self, output_path: Union[str, Path], max_shard_bytes: Optional[int] = None, eval_ratio: float = 0.0):
+        self.output_path = Path(output_path)
+        self.max_shard_bytes = max_shard_bytes
+        self.eval_ratio = eval_ratio
+        self.extra: Dict[str, Any] = {}
+        self._writers: Dict[str, _SplitWriter] = {}
+
+    def __enter__(self):
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._remove_old_shards()
+        return self
+
+    def _remove_old_shards(self) -> None:
+        """删除上一次生成的分片，避免分片数变少时残留旧文件"""
+        remove_shards(self.output_path)
+
+    def write(self, sample_id: str, line: str) -> str:
+        """
+        写入一行训练样本
+
+        Returns:
+            样本所属的划分（train/eval）
+        """
+        split = split_for_id(sample_id, self.eval_ratio)
+        writer = self._writers.get(split)
+        if writer is None:
+            writer = self._writers[split] = _SplitWriter(self.output_path, split, self.max_shard_bytes)
+        writer.write(line)
+        return split
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for writer in self._writers.values():
+            writer.close()
+
+        # 出错时不写分片清单
+        if exc_type is not None:
+            return False
+
+        splits = {split: writer.shards for split, writer in sorted(self._writers.items())}
+        manifest = {
+            'version': SHARDS_VERSION,
+            'max_shard_bytes': self.max_shard_bytes,
+            'eval_ratio': self.eval_ratio,
+            'num_samples': {split: sum(s['num_samples'] for s in shards) for split, shards in splits.items()},
+            'splits': splits,
+            **self.extra
+        }
+        manifest_path = shards_manifest_path(self.output_path)
+        tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+        return False
+
+
+class ShardedJsonlReader:
+    """按全局下标随机读取某个划分的样本（只打开需要的分片）"""
+
+    def __init__(self, manifest_path: Union[str, Path], split: str = 'train'):
+        self.manifest_path = Path(manifest_path)
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get('version') != SHARDS_VERSION:
+            raise ValueError(f"不支持的分片清单版本: {self.manifest.get('version')}")
+
+        self.split = split
+        self.shards = self.manifest['splits'].get(split, [])
+        self._starts = []
+        total = 0
+        for shard in self.shards:
+            self._starts.append(total)
+            total += shard['num_samples']
+        self._len = total
+
+    @property
+    def files(self) -> List[str]:
+        """该划分所有分片文件的路径"""
+        return [str(self.manifest_path.with_name(shard['file'])) for shard in self.shards]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read_line(self, index: int) -> str:
+        """读取第 index 行原始文本（不含换行符）"""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+
+        shard_idx = bisect.bisect_right(self._starts, index) - 1
+        shard = self.shards[shard_idx]
+        local = index - self._starts[shard_idx]
+
+        with open(self.manifest_path.with_name(shard['index']), 'rb') as f:
+            f.seek(local * OFFSET_SIZE)
+            start, end = struct.unpack('<2q', f.read(2 * OFFSET_SIZE))
+
+        with open(self.manifest_path.with_name(shard['file']), 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8').rstrip('\n')
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return json.loads(self.read_line(index))
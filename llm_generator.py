@@ -4,27 +4,84 @@
 """
 import datetime
 import json
+import threading
+import time
+from contextlib import contextmanager
 
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
-from peft import PeftModel
+from peft import PeftConfig, PeftModel
 from pathlib import Path
 import re
 
+from model_store import current_model_path, current_version, list_versions
+
+# PEFT 中表示"不使用任何适配器"的保留名称
+BASE_ADAPTER = "__base__"
+
+
+class _ReadWriteLock:
+    """
+    读写锁：多个读者可以同时持有，写者独占
+
+    有写者等待时，新的读者也要等待，避免写者一直拿不到锁
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
 class LLMTrajectoryGenerator:
-    """基于LLM的轨迹生成器"""
+    """
+    基于LLM的轨迹生成器
 
-    def __init__(self, model_path=None, device=None):
+    可以在同一个基础模型上加载多个 LoRA 适配器（如不同画布尺寸、不同数据集），
+    每个请求通过 adapter 参数选择适配器，不同适配器的请求可以在同一次前向计算中批量生成。
+    显存/内存只随适配器数量增长，不需要为每个适配器加载一份完整模型。
+    """
+
+    def __init__(self, model_path=None, device=None, adapters=None):
         """
         Args:
-            model_path: 微调后的模型路径
+            model_path: 微调后的模型路径，默认使用模型版本库的当前版本（见 model_store.py），
+                        版本库为空时使用 models/final_model。LoRA 目录会以 "default" 为名加载
             device: 设备（auto/cpu/cuda/mps）
+            adapters: 额外的适配器 {名称: LoRA目录}，必须与 model_path 使用同一个基础模型
         """
-        if model_path is None:
-            model_path = Path(__file__).parent / "models/final_model"
-
-        self.model_path = Path(model_path)
-
         if device is None:
             if torch.cuda.is_available():
                 device = "cuda"
@@ -34,21 +91,189 @@ class LLMTrajectoryGenerator:
                 device = "cpu"
 
         self.device = device
-        print(f"🤖 Loading LLM model from {self.model_path}")
+        # 保护 (model_path, tokenizer, model) 的整体替换
+        self._swap_lock = threading.Lock()
+        # 同一时间只允许一个后台重新加载
+        self._reload_lock = threading.Lock()
+        # 生成时持有读锁，追加/卸载适配器时持有写锁（修改的是正在使用的模型）
+        self._adapter_lock = _ReadWriteLock()
+        # 采样使用进程全局的随机数生成器：不带 seed 的生成持有读锁，带 seed 的生成持有写锁独占
+        self._rng_lock = _ReadWriteLock()
+
+        self.model_path = self._resolve_model_path(model_path)
+        self.adapter_paths = {name: Path(path) for name, path in (adapters or {}).items()}
         print(f"📍 Device: {self.device}")
+        self.tokenizer, self.model, self.default_adapter = self._load(self.model_path, dict(self.adapter_paths))
+
+    @staticmethod
+    def _resolve_model_path(model_path=None):
+        """未指定路径时，优先使用模型版本库的当前版本"""
+        if model_path is not None:
+            return Path(model_path)
+
+        final_model = Path(__file__).parent / "models/final_model"
+        store_path = current_model_path()
+        if store_path is None:
+            return final_model
+
+        # models/final_model 在安装当前版本之后又被修改过（例如手动解压或旧版训练脚本），提示安装
+        if final_model.is_dir():
+            version = current_version()
+            installed_at = next((v['installed_at'] for v in list_versions() if v['version'] == version), None)
+            mtimes = [p.stat().st_mtime for p in final_model.rglob('*') if p.is_file()]
+            if installed_at is not None and mtimes and max(mtimes) > installed_at:
+                print(
+                    f"⚠️  {final_model} 比版本库当前版本 {version}"
+                    f"（安装于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(installed_at))}）更新，"
+                    f"仍使用版本库当前版本。\n"
+                    f"   如需使用它，请运行: python model_store.py install {final_model}"
+                )
+        return store_path
+
+    def _load(self, model_path, adapter_paths):
+        """
+        加载tokenizer、基础模型和所有适配器
 
-        # 加载tokenizer和模型
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path, trust_remote_code=True)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            self.model_path,
-            device_map=device,
-            dtype=torch.float16 if device in ["cuda", "mps"] else torch.float32,
+        Returns:
+            (tokenizer, model, 默认适配器名称)
+        """
+        print(f"🤖 Loading LLM model from {model_path}")
+        tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        # 批量生成时左侧填充，保证所有序列从同一位置开始续写
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        # model_path 是 LoRA 目录时作为默认适配器，否则作为基础模型
+        adapters = {}
+        if (Path(model_path) / "adapter_config.json").exists():
+            adapters["default"] = Path(model_path)
+        adapters.update(adapter_paths)
+
+        if not adapters:
+            model = AutoModelForCausalLM.from_pretrained(
+                model_path,
+                device_map=self.device,
+                dtype=self._dtype(),
+                trust_remote_code=True  # Qwen需要信任远程代码
+            )
+            model.eval()
+            print(f"✅ Model loaded successfully")
+            return tokenizer, model, BASE_ADAPTER
+
+        # 所有适配器必须基于同一个基础模型；model_path 是完整模型时直接作为基础模型
+        base_names = {name: PeftConfig.from_pretrained(path).base_model_name_or_path for name, path in adapters.items()}
+        if len(set(base_names.values())) > 1:
+            raise ValueError(f"适配器的基础模型不一致: {base_names}")
+        base_name = base_names["default"] if "default" in adapters else str(model_path)
+
+        print(f"🧱 Base model: {base_name}")
+        base = AutoModelForCausalLM.from_pretrained(
+            base_name,
+            device_map=self.device,
+            dtype=self._dtype(),
             trust_remote_code=True  # Qwen需要信任远程代码
         )
-        self.model.eval()
-        print(f"✅ Model loaded successfully")
 
-    def generate(self, target_distance, canvas_length=280, temperature=0.8, top_p=0.95):
+        model = None
+        for name, path in adapters.items():
+            print(f"🔌 Loading adapter '{name}' from {path}")
+            if model is None:
+                model = PeftModel.from_pretrained(base, path, adapter_name=name)
+            else:
+                model.load_adapter(path, adapter_name=name)
+        model.eval()
+        print(f"✅ Model loaded successfully ({len(adapters)} adapters)")
+        return tokenizer, model, "default" if "default" in adapters else BASE_ADAPTER
+
+    def _dtype(self):
+        return torch.float16 if self.device in ["cuda", "mps"] else torch.float32
+
+    @property
+    def adapters(self):
+        """已加载的适配器名称"""
+        with self._swap_lock:
+            model = self.model
+        return list(model.peft_config) if isinstance(model, PeftModel) else []
+
+    def add_adapter(self, name, adapter_path):
+        """
+        在运行中的基础模型上追加一个适配器（已有同名适配器时报错）
+
+        等待正在进行的生成结束后再修改模型；有重新加载在进行时等待其完成
+
+        Args:
+            name: 适配器名称
+            adapter_path: LoRA 目录
+        """
+        with self._reload_lock, self._adapter_lock.write():
+            model = self.model
+            if not isinstance(model, PeftModel):
+                raise ValueError("当前模型没有以 LoRA 方式加载，无法追加适配器")
+            if name in model.peft_config:
+                raise ValueError(f"适配器已存在: {name}")
+
+            model.load_adapter(adapter_path, adapter_name=name)
+            self.adapter_paths[name] = Path(adapter_path)
+        print(f"🔌 Adapter '{name}' loaded from {adapter_path}")
+
+    def remove_adapter(self, name):
+        """卸载一个适配器，释放其权重（等待正在使用它的生成结束）"""
+        with self._reload_lock, self._adapter_lock.write():
+            if name == self.default_adapter:
+                raise ValueError(f"不能卸载默认适配器: {name}")
+            model = self.model
+            if not isinstance(model, PeftModel) or name not in model.peft_config:
+                raise ValueError(f"适配器不存在: {name}")
+
+            model.delete_adapter(name)
+            self.adapter_paths.pop(name, None)
+
+    def reload(self, model_path=None, wait=False, force=False):
+        """
+        在后台加载新模型，加载完成后在两次请求之间原子地替换
+
+        正在进行的 generate() 会继续使用旧模型直到结束，之后的请求使用新模型；
+        加载失败时保留旧模型。加载期间 add_adapter()/remove_adapter() 会等待加载结束。
+
+        Args:
+            model_path: 新模型路径，默认重新读取模型版本库的当前版本
+            wait: 是否等待加载完成
+            force: 路径与当前相同时也重新加载
+
+        Returns:
+            后台加载线程；无需重新加载或已有重新加载在进行时返回 None
+        """
+        new_path = self._resolve_model_path(model_path)
+        if new_path == self.model_path and not force:
+            return None
+
+        if not self._reload_lock.acquire(blocking=False):
+            print("⚠️  Reload already in progress")
+            return None
+
+        # 持有 _reload_lock 期间不会追加/卸载适配器，快照与新模型一致
+        adapter_paths = dict(self.adapter_paths)
+
+        def _worker():
+            try:
+                tokenizer, model, default_adapter = self._load(new_path, adapter_paths)
+                with self._swap_lock:
+                    self.model_path, self.tokenizer, self.model = new_path, tokenizer, model
+                    self.default_adapter = default_adapter
+                print(f"🔄 Switched to model {new_path}")
+            except Exception as e:
+                print(f"❌ Reload failed, keeping {self.model_path}: {e}")
+            finally:
+                self._reload_lock.release()
+
+        thread = threading.Thread(target=_worker, name="llm-reload", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return thread
+
+    def generate(self, target_distance, canvas_length=280, temperature=0.8, top_p=0.95, adapter=None, seed=None):
         """
         生成轨迹
 
@@ -57,35 +282,103 @@ class LLMTrajectoryGenerator:
             canvas_length: 画布长度
             temperature: 采样温度（越高越多样）
             top_p: nucleus sampling参数
+            adapter: 使用的适配器名称，None 表示默认适配器
+            seed: 随机种子，相同的种子生成相同的结果
 
         Returns:
             tracks: List[Dict] - 轨迹点 [{'a': x, 'b': y, 'c': dt}, ...]
         """
-        # 构建输入
-        input_text = f"<|input|>distance:{int(target_distance)},canvas:{canvas_length}<|output|>"
-
-        # Token化
-        inputs = self.tokenizer(input_text, return_tensors="pt").to(self.device)
-
-        # 生成
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=300,
-                temperature=temperature,
-                top_p=top_p,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id,
-                eos_token_id=self.tokenizer.encode("<|end|>")[0] if "<|end|>" in self.tokenizer.get_vocab() else self.tokenizer.eos_token_id
-            )
+        request = {'target_distance': target_distance, 'canvas_length': canvas_length, 'adapter': adapter}
+        return self.generate_batch([request], temperature=temperature, top_p=top_p, seed=seed)[0]
+
+    def generate_batch(self, requests, temperature=0.8, top_p=0.95, seed=None):
+        """
+        批量生成轨迹，不同适配器的请求在同一次前向计算中完成
 
-        # 解码
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=False)
+        Args:
+            requests: List[Dict]，每项包含 target_distance，可选 canvas_length（默认280）和 adapter
+            temperature: 采样温度（越高越多样）
+            top_p: nucleus sampling参数
+            seed: 随机种子，相同的种子和相同的请求批次生成相同的结果
 
-        # 解析轨迹
-        tracks = self._parse_trajectory(generated_text, target_distance)
+        Returns:
+            List[List[Dict]] - 与 requests 顺序一致的轨迹
+        """
+        if not requests:
+            return []
 
-        return tracks
+        # 生成期间持有读锁：追加/卸载适配器会等待正在进行的生成结束
+        with self._adapter_lock.read():
+            # 取一次模型引用，整个请求期间即使发生 reload() 也使用同一个模型
+            with self._swap_lock:
+                tokenizer, model, default_adapter = self.tokenizer, self.model, self.default_adapter
+
+            # 每个请求选择的适配器
+            adapter_names = [r.get('adapter') or default_adapter for r in requests]
+            available = set(model.peft_config) if isinstance(model, PeftModel) else set()
+            unknown = {name for name in adapter_names if name != BASE_ADAPTER and name not in available}
+            if unknown:
+                raise ValueError(f"未加载的适配器: {sorted(unknown)}")
+
+            generate_kwargs = {}
+            if isinstance(model, PeftModel):
+                generate_kwargs['adapter_names'] = adapter_names
+
+            # 构建输入
+            input_texts = [
+                f"<|input|>distance:{int(r['target_distance'])},canvas:{r.get('canvas_length', 280)}<|output|>"
+                for r in requests
+            ]
+
+            # Token化
+            inputs = tokenizer(input_texts, return_tensors="pt", padding=True).to(self.device)
+
+            # 生成
+            with self._seeded_rng(seed) if seed is not None else self._rng_lock.read(), torch.no_grad():
+                outputs = model.generate(
+                    **inputs,
+                    max_new_tokens=300,
+                    temperature=temperature,
+                    top_p=top_p,
+                    do_sample=True,
+                    pad_token_id=tokenizer.pad_token_id,
+                    eos_token_id=tokenizer.encode("<|end|>")[0] if "<|end|>" in tokenizer.get_vocab() else tokenizer.eos_token_id,
+                    **generate_kwargs
+                )
+
+            # 解码并解析轨迹（去掉批量生成产生的填充）
+            results = []
+            for request, output in zip(requests, outputs):
+                generated_text = tokenizer.decode(output[output != tokenizer.pad_token_id], skip_special_tokens=False)
+                results.append(self._parse_trajectory(generated_text, request['target_distance']))
+
+        return results
+
+    @contextmanager
+    def _seeded_rng(self, seed):
+        """
+        在固定种子下采样，结束后恢复全局随机数状态
+
+        transformers 的采样没有 generator 参数，只能临时设置全局随机数状态。
+        期间持有 _rng_lock 的写锁，其他线程的生成（带或不带 seed）都要等待，
+        否则它们会从同一个全局随机数生成器取数，破坏这次生成的可复现性。
+        torch.manual_seed 会同时设置 CPU、CUDA 和 MPS 的种子，三者都要恢复
+        （fork_rng 默认只处理 CUDA，device_type 参数在较新的 torch 中才有）。
+        """
+        device_type = torch.device(self.device).type
+        with self._rng_lock.write():
+            cpu_state = torch.get_rng_state()
+            cuda_states = torch.cuda.get_rng_state_all() if device_type == "cuda" else None
+            mps_state = torch.mps.get_rng_state() if device_type == "mps" else None
+            try:
+                torch.manual_seed(seed)
+                yield
+            finally:
+                torch.set_rng_state(cpu_state)
+                if cuda_states is not None:
+                    torch.cuda.set_rng_state_all(cuda_states)
+                if mps_state is not None:
+                    torch.mps.set_rng_state(mps_state)
 
     def _parse_trajectory(self, text, target_distance):
         """
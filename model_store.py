@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+本地模型版本库（按内容寻址）
+
+目录结构:
+    models/store/
+    ├── current                 # 当前版本 id（原子替换，读者不会看到写了一半的内容）
+    └── versions/
+        ├── 3f2a9c1e0b7d4a56/   # 以模型目录内容哈希命名的只读版本
+        ├── 3f2a9c1e0b7d4a56.json  # 版本信息（来源、安装时间等）
+        └── ...
+
+新版本先完整复制到临时目录，再通过一次 rename 放到 versions/ 下，最后原子地更新 current，
+因此正在加载模型的进程永远不会读到半成品目录。
+
+使用方法:
+    python model_store.py install models/final_model   # 安装并切换到该版本
+    python model_store.py list                          # 列出所有版本
+    python model_store.py use 3f2a9c1e0b7d4a56          # 切换当前版本
+    python model_store.py prune --keep 3                # 只保留最近 3 个版本
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+MODEL_STORE_DIR = Path(__file__).parent / "models" / "store"
+
+# 版本 id 使用内容哈希的前若干位
+VERSION_ID_LENGTH = 16
+
+
+def hash_model_dir(model_dir: Union[str, Path]) -> str:
+    """计算模型目录的内容哈希（相对路径 + 文件内容，与修改时间无关）"""
+    model_dir = Path(model_dir)
+    digest = hashlib.sha256()
+    for path in sorted(p for p in model_dir.rglob('*') if p.is_file()):
+        digest.update(path.relative_to(model_dir).as_posix().encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            for buffer in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(buffer)
+        digest.update(b'\0')
+    return digest.hexdigest()[:VERSION_ID_LENGTH]
+
+
+def _versions_dir(store_dir: Path) -> Path:
+    return store_dir / "versions"
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def install_version(
+    model_dir: Union[str, Path],
+    store_dir: Union[str, Path] = MODEL_STORE_DIR,
+    info: Optional[Dict[str, Any]] = None,
+    activate: bool = True
+) -> str:
+    """
+    将模型目录安装为一个版本（内容相同的版本只保存一份）
+
+    Args:
+        model_dir: 模型目录
+        store_dir: 版本库目录
+        info: 额外的版本信息（如 release tag）
+        activate: 安装后是否切换为当前版本
+
+    Returns:
+        版本 id
+    """
+    model_dir = Path(model_dir)
+    store_dir = Path(store_dir)
+    versions_dir = _versions_dir(store_dir)
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    version = hash_model_dir(model_dir)
+    target = versions_dir / version
+
+    if not target.exists():
+        # 先复制到临时目录，再一次性 rename，其他进程看不到半成品
+        tmp_dir = versions_dir / f".tmp-{uuid.uuid4().hex}"
+        shutil.copytree(model_dir, tmp_dir)
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # 其他进程已安装了相同内容的版本
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not target.exists():
+                raise
+
+    # 重复安装相同内容时也刷新安装时间（llm_generator 据此判断 models/final_model 是否已安装）
+    meta_path = versions_dir / f"{version}.json"
+    meta = json.loads(meta_path.read_text(encoding='utf-8')) if meta_path.exists() else {}
+    meta.update({'version': version, 'source': str(model_dir), 'installed_at': time.time(), **(info or {})})
+    _atomic_write_text(meta_path, json.dumps(meta, ensure_ascii=False, indent=2))
+
+    if activate:
+        set_current(version, store_dir)
+    return version
+
+
+def set_current(version: str, store_dir: Union[str, Path] = MODEL_STORE_DIR) -> None:
+    """原子地切换当前版本"""
+    store_dir = Path(store_dir)
+    if not (_versions_dir(store_dir) / version).is_dir():
+        raise FileNotFoundError(f"模型版本不存在: {version}")
+    _atomic_write_text(store_dir / "current", version)
+
+
+def current_version(store_dir: Union[str, Path] = MODEL_STORE_DIR) -> Optional[str]:
+    """当前版本 id，版本库为空时返回 None"""
+    pointer = Path(store_dir) / "current"
+    try:
+        version = pointer.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def version_path(version: str, store_dir: Union[str, Path] = MODEL_STORE_DIR) -> Path:
+    """版本对应的模型目录"""
+    return _versions_dir(Path(store_dir)) / version
+
+
+def current_model_path(store_dir: Union[str, Path] = MODEL_STORE_DIR) -> Optional[Path]:
+    """当前版本的模型目录，版本库为空时返回 None"""
+    version = current_version(store_dir)
+    if version is None:
+        return None
+    path = version_path(version, store_dir)
+    return path if path.is_dir() else None
+
+
+def list_versions(store_dir: Union[str, Path] = MODEL_STORE_DIR) -> List[Dict[str, Any]]:
+    """所有版本的信息，按安装时间从新到旧排列"""
+    versions_dir = _versions_dir(Path(store_dir))
+    if not versions_dir.exists():
+        return []
+
+    versions = []
+    for path in versions_dir.iterdir():
+        if not path.is_dir() or path.name.startswith('.'):
+            continue
+        meta_path = versions_dir / f"{path.name}.json"
+        meta = json.loads(meta_path.read_text(encoding='utf-8')) if meta_path.exists() else {}
+        meta.setdefault('version', path.name)
+        meta.setdefault('installed_at', path.stat().st_mtime)
+        versions.append(meta)
+    return sorted(versions, key=lambda m: m['installed_at'], reverse=True)
+
+
+def prune_versions(keep: int = 3, store_dir: Union[str, Path] = MODEL_STORE_DIR) -> List[str]:
+    """
+    删除旧版本，保留最近安装的 keep 个（当前版本总是保留）
+
+    Returns:
+        被删除的版本 id
+    """
+    store_dir = Path(store_dir)
+    current = current_version(store_dir)
+    removed = []
+    for meta in list_versions(store_dir)[keep:]:
+        version = meta['version']
+        if version == current:
+            continue
+        shutil.rmtree(version_path(version, store_dir), ignore_errors=True)
+        meta_path = _versions_dir(store_dir) / f"{version}.json"
+        if meta_path.exists():
+            meta_path.unlink()
+        removed.append(version)
+    return removed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='本地模型版本库')
+    parser.add_argument('--store_dir', type=str, default=str(MODEL_STORE_DIR), help='版本库目录')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    install_parser = subparsers.add_parser('install', help='安装模型目录为新版本并切换')
+    install_parser.add_argument('model_dir', type=str, help='模型目录（如 models/final_model）')
+    install_parser.add_argument('--no_activate', action='store_true', help='只安装，不切换当前版本')
+
+    subparsers.add_parser('list', help='列出所有版本')
+
+    use_parser = subparsers.add_parser('use', help='切换当前版本')
+    use_parser.add_argument('version', type=str, help='版本 id')
+
+    prune_parser = subparsers.add_parser('prune', help='删除旧版本')
+    prune_parser.add_argument('--keep', type=int, default=3, help='保留的版本数，默认3')
+
+    args = parser.parse_args()
+
+    if args.command == 'install':
+        version = install_version(args.model_dir, args.store_dir, activate=not args.no_activate)
+        print(f"✅ 已安装版本: {version}")
+        if not args.no_activate:
+            print(f"📌 当前版本: {version}")
+    elif args.command == 'list':
+        current = current_version(args.store_dir)
+        versions = list_versions(args.store_dir)
+        if not versions:
+            print("📭 版本库为空")
+        for meta in versions:
+            marker = '👉' if meta['version'] == current else '  '
+            installed = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['installed_at']))
+            print(f"{marker} {meta['version']}  {installed}  {meta.get('tag', meta.get('source', ''))}")
+    elif args.command == 'use':
+        set_current(args.version, args.store_dir)
+        print(f"📌 当前版本: {args.version}")
+    elif args.command == 'prune':
+        removed = prune_versions(args.keep, args.store_dir)
+        print(f"🧹 已删除 {len(removed)} 个旧版本" + (f": {', '.join(removed)}" if removed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+batch_generate.py 的测试（使用假的生成器代替模型）
+
+覆盖：无效请求行输出错误记录而不中断整个批量生成、带 seed 与不带 seed 的请求分组
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# batch_generate 通过 llm_generator 依赖 torch/transformers/peft
+pytest.importorskip("peft")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import batch_generate  # noqa: E402
+
+
+class FakeGenerator:
+    """按请求返回固定轨迹，记录每次 generate_batch 的调用"""
+
+    def __init__(self, adapters=()):
+        self.adapters = set(adapters)
+        self.calls = []
+
+    def generate_batch(self, requests, temperature=0.8, top_p=0.95, seed=None):
+        self.calls.append((len(requests), temperature, top_p, seed))
+        unknown = {r['adapter'] for r in requests if r['adapter'] is not None} - self.adapters
+        if unknown:
+            raise ValueError(f"未加载的适配器: {sorted(unknown)}")
+        return [[{'a': r['target_distance'], 'b': 0, 'c': 0}] for r in requests]
+
+
+def write_requests(path, lines):
+    path.write_text(''.join(line + '\n' for line in lines), encoding='utf-8')
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+@pytest.mark.parametrize('bad_line', [
+    '{"distance": 100, "temperature": null}',
+    '{"distance": Infinity}',
+    '{"distance": NaN}',
+    '{"distance": 100, "top_p": "0.9"}',
+    '{"distance": 100, "top_p": 1.5}',
+    '{"distance": 100, "temperature": 0}',
+    '{"distance": 100, "adapter": ["a", "b"]}',
+    '{"distance": 100, "canvas": -Infinity}',
+    '{"distance": 100, "seed": 1.5}',
+    '[1, 2, 3]',
+    '{"distance": 100',
+])
+def test_bad_line_becomes_error_record(tmp_path, bad_line):
+    input_path = tmp_path / "requests.jsonl"
+    output_path = tmp_path / "trajectories.jsonl"
+    write_requests(input_path, [
+        '{"id": "r1", "distance": 101}',
+        '{"id": "r2", "distance": 102}',
+        bad_line,
+        '{"id": "r4", "distance": 104}',
+        '{"id": "r5", "distance": 105}',
+    ])
+
+    checkpoint = batch_generate.batch_generate(FakeGenerator(), input_path, output_path, batch_size=3)
+
+    records = read_records(output_path)
+    assert [r['line'] for r in records] == [1, 2, 3, 4, 5]
+    assert set(records[2]) == {'line', 'error'}
+    assert [r['id'] for r in records if 'error' not in r] == ['r1', 'r2', 'r4', 'r5']
+    assert [r['tracks'][0]['a'] for r in records if 'error' not in r] == [101, 102, 104, 105]
+    assert checkpoint['done'] and checkpoint['generated'] == 4 and checkpoint['errors'] == 1
+
+
+def test_unknown_adapter_only_fails_its_request(tmp_path):
+    input_path = tmp_path / "requests.jsonl"
+    output_path = tmp_path / "trajectories.jsonl"
+    write_requests(input_path, [
+        '{"distance": 101, "adapter": "canvas340"}',
+        '{"distance": 102, "adapter": "missing"}',
+        '{"distance": 103}',
+    ])
+
+    batch_generate.batch_generate(FakeGenerator(adapters=['canvas340']), input_path, output_path)
+
+    records = read_records(output_path)
+    assert ['error' in r for r in records] == [False, True, False]
+    assert 'missing' in records[1]['error']
+
+
+def test_seeded_and_unseeded_requests_are_generated_separately(tmp_path):
+    input_path = tmp_path / "requests.jsonl"
+    write_requests(input_path, [
+        '{"distance": 101, "seed": 1}',
+        '{"distance": 102}',
+        '{"distance": 103, "seed": 2}',
+        '{"distance": 104}',
+        '{"distance": 105, "seed": 3, "temperature": 0.5}',
+    ])
+
+    generator = FakeGenerator()
+    batch_generate.batch_generate(generator, input_path, tmp_path / "a.jsonl", batch_size=8, temperature=0.8)
+    calls = sorted(generator.calls, key=lambda call: (call[1], call[3] is None))
+    # 不同 seed 的请求在同一次调用中生成，不带 seed 的请求不固定种子
+    assert [(size, temperature, seed is None) for size, temperature, _, seed in calls] == [
+        (1, 0.5, False), (2, 0.8, False), (2, 0.8, True)
+    ]
+
+    # 同一个文件、相同批大小重新生成时种子相同
+    first = generator.calls
+    generator.calls = []
+    batch_generate.batch_generate(generator, input_path, tmp_path / "b.jsonl", batch_size=8, temperature=0.8)
+    assert generator.calls == first
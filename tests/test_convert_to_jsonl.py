@@ -0,0 +1,139 @@
+"""
+convert_to_jsonl.py 增量转换的测试
+
+覆盖：全量重建、只追加新增文件、修改/删除/无效变有效后的流式重写、只有 mtime 变化、
+输出文件被外部修改后重建；每一步都与全量转换的结果比较
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import convert_to_jsonl  # noqa: E402
+
+
+def annotation(distance, points=12, dt=60, canvas=280):
+    """一个标注文件的内容，默认满足质量过滤条件（12 个点，总时长 720ms）"""
+    return {
+        'id': f"sample-{distance}",
+        'targetDistance': distance,
+        'canvasLength': canvas,
+        'tracks': [{'a': i * distance // points, 'b': i % 3, 'c': dt} for i in range(points)],
+    }
+
+
+def write_annotation(input_dir, name, data):
+    path = input_dir / name
+    path.write_text(json.dumps(data), encoding='utf-8')
+    # 保证修改后 mtime 一定变化（部分文件系统的时间精度较低）
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    return path
+
+
+def full_conversion(input_dir, tmp_path):
+    output = tmp_path / "full" / "expected.jsonl"
+    convert_to_jsonl.convert_to_jsonl(str(input_dir), str(output), quiet=True)
+    return sorted(output.read_text(encoding='utf-8').splitlines())
+
+
+def incremental(input_dir, output):
+    return convert_to_jsonl.convert_incremental(str(input_dir), str(output))
+
+
+def lines_of(output):
+    return sorted(output.read_text(encoding='utf-8').splitlines())
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+    path = tmp_path / "metadata"
+    path.mkdir()
+    write_annotation(path, "a.json", annotation(100))
+    write_annotation(path, "b.json", annotation(110))
+    write_annotation(path, "c.json", annotation(120, points=3))  # 点数不足，无效
+    return path
+
+
+def test_incremental_matches_full_conversion(input_dir, tmp_path):
+    output = tmp_path / "out" / "training_data.jsonl"
+
+    # 第一次：没有清单，全量重建
+    stats = incremental(input_dir, output)
+    assert stats['rebuild'] and stats['added'] == 3
+    assert stats['valid'] == 2 and stats['invalid'] == 1
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
+
+    # 没有变化：不重写输出
+    mtime = output.stat().st_mtime_ns
+    stats = incremental(input_dir, output)
+    assert not stats['rebuild'] and (stats['added'], stats['updated'], stats['removed']) == (0, 0, 0)
+    assert stats['unchanged'] == 3
+    assert output.stat().st_mtime_ns == mtime
+
+    # 只有新增文件：追加
+    write_annotation(input_dir, "d.json", annotation(130))
+    stats = incremental(input_dir, output)
+    assert (stats['added'], stats['updated'], stats['removed']) == (1, 0, 0)
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
+
+    # 修改、删除、无效变有效、新增同时发生：流式重写
+    write_annotation(input_dir, "a.json", annotation(105))
+    (input_dir / "b.json").unlink()
+    write_annotation(input_dir, "c.json", annotation(120))
+    write_annotation(input_dir, "e.json", annotation(140, points=2))
+    stats = incremental(input_dir, output)
+    assert (stats['added'], stats['updated'], stats['removed']) == (1, 2, 1)
+    assert stats['valid'] == 3 and stats['invalid'] == 1
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
+
+    # 有效变无效
+    write_annotation(input_dir, "d.json", annotation(130, dt=1000))
+    stats = incremental(input_dir, output)
+    assert stats['updated'] == 1 and stats['valid'] == 2
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
+
+
+def test_touched_file_is_not_reprocessed(input_dir, tmp_path):
+    output = tmp_path / "training_data.jsonl"
+    incremental(input_dir, output)
+    before = output.read_text(encoding='utf-8')
+
+    # 只改 mtime，内容不变
+    path = input_dir / "a.json"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    stats = incremental(input_dir, output)
+    assert (stats['added'], stats['updated'], stats['removed']) == (0, 0, 0)
+    assert output.read_text(encoding='utf-8') == before
+
+    # 清单已记录新的 mtime，再次运行不再读取该文件
+    stats = incremental(input_dir, output)
+    assert stats['unchanged'] == 3
+
+
+def test_edited_output_triggers_rebuild(input_dir, tmp_path):
+    output = tmp_path / "training_data.jsonl"
+    incremental(input_dir, output)
+
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('{"text": "手动添加的行"}\n')
+    stats = incremental(input_dir, output)
+    assert stats['rebuild']
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
+
+
+def test_full_conversion_manifest_supports_incremental(input_dir, tmp_path):
+    output = tmp_path / "training_data.jsonl"
+    convert_to_jsonl.convert_to_jsonl(str(input_dir), str(output), quiet=True)
+
+    # 全量转换写出的清单可以直接用于增量转换
+    (input_dir / "a.json").unlink()
+    stats = incremental(input_dir, output)
+    assert not stats['rebuild'] and stats['removed'] == 1
+    assert lines_of(output) == full_conversion(input_dir, tmp_path)
@@ -0,0 +1,368 @@
+"""
+download_model.py 的下载测试（使用本地 HTTP 服务器代替 GitHub）
+
+覆盖：单连接、多连接并行、连接中断重试、服务器不支持 Range、断点续传、
+断点文件与服务器文件不一致、SHA-256 校验失败、带数据描述符的 zip 边下载边解压
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import download_model  # noqa: E402
+
+
+class FileServer:
+    """
+    提供单个文件的本地 HTTP 服务器
+
+    Attributes:
+        data: 文件内容
+        etag: ETag（None 表示不返回）
+        support_range: 是否支持 Range 请求
+        drop_after: 前 drop_count 个下载请求（不含探测请求）只发送这么多字节就断开连接（None 表示不断开）
+        delay: 每发送 4KB 等待的秒数（模拟慢速连接）
+        requests: 收到的请求头 (Range, If-Range) 列表
+    """
+
+    def __init__(self, data, etag='"v1"', support_range=True):
+        self.data = data
+        self.etag = etag
+        self.support_range = support_range
+        self.drop_after = None
+        self.drop_count = 0
+        self.delay = 0
+        self.requests = []
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/final_model.zip"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def handle(self, handler):
+        range_header = handler.headers.get('Range')
+        if_range = handler.headers.get('If-Range')
+        with self.lock:
+            self.requests.append((range_header, if_range))
+            drop = self.drop_after is not None and self.drop_count > 0 and range_header != 'bytes=0-0'
+            if drop:
+                self.drop_count -= 1
+
+        data = self.data
+        start, end = 0, len(data) - 1
+        partial = False
+        if range_header and self.support_range and (if_range is None or if_range == self.etag):
+            spec = range_header.split('=', 1)[1]
+            first, _, last = spec.partition('-')
+            start = int(first)
+            end = int(last) if last else len(data) - 1
+            partial = True
+
+        body = data[start:end + 1]
+        handler.send_response(206 if partial else 200)
+        handler.send_header('Content-Length', str(len(body)))
+        if partial:
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        if self.support_range:
+            handler.send_header('Accept-Ranges', 'bytes')
+        if self.etag:
+            handler.send_header('ETag', self.etag)
+        handler.end_headers()
+
+        if drop:
+            handler.wfile.write(body[:self.drop_after])
+            handler.wfile.flush()
+            handler.close_connection = True
+            return
+        if self.delay:
+            try:
+                for i in range(0, len(body), 4096):
+                    handler.wfile.write(body[i:i + 4096])
+                    handler.wfile.flush()
+                    time.sleep(self.delay)
+            except OSError:
+                handler.close_connection = True
+            return
+        handler.wfile.write(body)
+
+    def body_requests(self):
+        """除探测请求（bytes=0-0）外的请求"""
+        return [r for r in self.requests if r[0] != 'bytes=0-0']
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """重试等待缩短到 10ms，小文件也走并行下载"""
+    real_sleep = time.sleep
+    monkeypatch.setattr(download_model.time, 'sleep', lambda seconds: real_sleep(min(seconds, 0.01)))
+    monkeypatch.setattr(download_model, 'MIN_PARALLEL_SIZE', 1024)
+    monkeypatch.setattr(download_model, 'MIN_BLOCK_SIZE', 4096)
+
+
+@pytest.fixture
+def payload():
+    return os.urandom(300 * 1024 + 17)
+
+
+@pytest.fixture
+def server(payload):
+    srv = FileServer(payload)
+    yield srv
+    srv.close()
+
+
+def sha256_of(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_single_connection(server, payload, tmp_path):
+    target = tmp_path / "final_model.zip"
+    ok, extracted = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=1)
+
+    assert ok and not extracted
+    assert target.read_bytes() == payload
+    assert not (tmp_path / "final_model.zip.part").exists()
+    assert not (tmp_path / "final_model.zip.part.json").exists()
+
+
+def test_parallel_connections(server, payload, tmp_path):
+    target = tmp_path / "final_model.zip"
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=4)
+
+    assert ok
+    assert target.read_bytes() == payload
+    ranges = {r[0] for r in server.body_requests()}
+    assert len(ranges) == 4
+    assert not (tmp_path / "final_model.zip.part.json").exists()
+
+
+@pytest.mark.parametrize('connections', [1, 4])
+def test_dropped_connection_is_retried(server, payload, tmp_path, connections):
+    server.drop_after = 10000
+    server.drop_count = 2
+    target = tmp_path / "final_model.zip"
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=connections)
+
+    assert ok
+    assert target.read_bytes() == payload
+    # 断开后用 Range 从断点继续（起点不是分段的起点），而不是重新下载整个分段
+    chunk_size = -(-len(payload) // connections)
+    starts = [int(r[0].split('=')[1].split('-')[0]) for r in server.body_requests() if r[0]]
+    assert any(start % chunk_size for start in starts)
+
+
+def test_interrupted_parallel_download_stops_promptly(server, payload, tmp_path):
+    server.delay = 0.05
+    target = tmp_path / "final_model.zip"
+    part = tmp_path / "final_model.zip.part"
+    received = 0
+
+    def consume(data):
+        nonlocal received
+        received += len(data)
+        if received >= 8192:
+            raise KeyboardInterrupt
+
+    # 模拟下载过程中按 Ctrl+C：分段线程应当停止，而不是把所有分段下载完
+    part.parent.mkdir(exist_ok=True)
+    progress = download_model.ProgressBar(len(payload))
+    start = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        download_model._download_parallel(server.url, part, len(payload), 4, consume, progress)
+    assert time.monotonic() - start < 2
+    assert progress.downloaded < len(payload) // 2
+    assert (tmp_path / "final_model.zip.part.json").exists()
+
+    # 重新运行从断点继续
+    server.delay = 0
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=4)
+    assert ok
+    assert target.read_bytes() == payload
+
+
+def test_server_without_range(payload, tmp_path):
+    srv = FileServer(payload, support_range=False)
+    try:
+        target = tmp_path / "final_model.zip"
+        ok, _ = download_model.download_file(srv.url, target, sha256=sha256_of(payload), connections=4)
+        assert ok
+        assert target.read_bytes() == payload
+        assert all(r[0] is None for r in srv.body_requests())
+    finally:
+        srv.close()
+
+
+@pytest.mark.parametrize('connections', [1, 4])
+def test_resume_after_failure(server, payload, tmp_path, monkeypatch, connections):
+    target = tmp_path / "final_model.zip"
+    part = tmp_path / "final_model.zip.part"
+
+    # 第一次运行：连接反复中断，重试次数用完后失败，保留断点文件
+    monkeypatch.setattr(download_model, 'MAX_RETRIES', 1)
+    server.drop_after = 50000
+    server.drop_count = 100
+    ok, _ = download_model.download_file(server.url, target, connections=connections)
+    assert not ok
+    assert part.exists()
+    assert (tmp_path / "final_model.zip.part.json").exists()
+
+    # 第二次运行：从断点继续，带 If-Range
+    monkeypatch.setattr(download_model, 'MAX_RETRIES', 5)
+    server.drop_count = 0
+    server.requests.clear()
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=connections)
+    assert ok
+    assert target.read_bytes() == payload
+    resumed = server.body_requests()
+    assert resumed and all(r[0] and not r[0].startswith('bytes=0-') for r in resumed)
+    assert all(r[1] == server.etag for r in resumed)
+
+
+def test_stale_part_from_another_release_is_discarded(server, payload, tmp_path):
+    target = tmp_path / "final_model.zip"
+    part = tmp_path / "final_model.zip.part"
+    state = tmp_path / "final_model.zip.part.json"
+
+    # 上一个版本留下的同名断点文件
+    part.write_bytes(b'x' * 1000)
+    state.write_text(json.dumps({'mode': 'single', 'url': server.url, 'total': len(payload), 'etag': '"v0"'}))
+
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=1)
+    assert ok
+    assert target.read_bytes() == payload
+    assert all(r[0] is None for r in server.body_requests())
+
+
+def test_part_larger_than_file_is_discarded(server, payload, tmp_path):
+    target = tmp_path / "final_model.zip"
+    part = tmp_path / "final_model.zip.part"
+    state = tmp_path / "final_model.zip.part.json"
+
+    part.write_bytes(payload + b'extra')
+    state.write_text(json.dumps({
+        'mode': 'single', 'url': server.url, 'total': len(payload), 'etag': server.etag, 'last_modified': None
+    }))
+
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=1)
+    assert ok
+    assert target.read_bytes() == payload
+
+
+def test_part_without_state_is_discarded(server, payload, tmp_path):
+    target = tmp_path / "final_model.zip"
+    (tmp_path / "final_model.zip.part").write_bytes(b'y' * 5000)
+
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(payload), connections=1)
+    assert ok
+    assert target.read_bytes() == payload
+
+
+def test_file_changed_during_resume(server, payload, tmp_path, monkeypatch):
+    target = tmp_path / "final_model.zip"
+    part = tmp_path / "final_model.zip.part"
+
+    monkeypatch.setattr(download_model, 'MAX_RETRIES', 1)
+    server.drop_after = 50000
+    server.drop_count = 100
+    ok, _ = download_model.download_file(server.url, target, connections=1)
+    assert not ok and part.exists()
+
+    # 新版本发布：内容和 ETag 都变了，旧的断点不能续传
+    new_payload = os.urandom(len(payload))
+    server.data = new_payload
+    server.etag = '"v2"'
+    server.drop_count = 0
+    ok, _ = download_model.download_file(server.url, target, sha256=sha256_of(new_payload), connections=1)
+    assert ok
+    assert target.read_bytes() == new_payload
+
+
+@pytest.mark.parametrize('connections', [1, 4])
+def test_checksum_mismatch(server, tmp_path, connections):
+    target = tmp_path / "final_model.zip"
+    ok, extracted = download_model.download_file(server.url, target, sha256='0' * 64, connections=connections)
+
+    assert not ok and not extracted
+    assert not target.exists()
+    assert not (tmp_path / "final_model.zip.part").exists()
+
+
+class _Unseekable(io.RawIOBase):
+    """不可 seek 的输出流，zipfile 写入时会使用数据描述符"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def make_zip(files, data_descriptor):
+    if data_descriptor:
+        stream = _Unseekable()
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+        data = stream.buffer.getvalue()
+    else:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, content in files.items():
+                zf.writestr(name, content)
+        data = buffer.getvalue()
+    return data
+
+
+@pytest.mark.parametrize('data_descriptor', [False, True])
+@pytest.mark.parametrize('connections', [1, 4])
+def test_streaming_extraction(tmp_path, data_descriptor, connections):
+    files = {
+        'final_model/config.json': b'{"model_type": "qwen2"}',
+        'final_model/model.safetensors': os.urandom(200 * 1024),
+        'final_model/tokenizer.json': b'{}' * 5000,
+    }
+    data = make_zip(files, data_descriptor)
+    if data_descriptor:
+        assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].flag_bits & 0x08
+
+    srv = FileServer(data)
+    try:
+        extract_to = tmp_path / "models"
+        target = tmp_path / "final_model.zip"
+        ok, extracted = download_model.download_file(
+            srv.url, target, sha256=sha256_of(data), connections=connections, extract_to=extract_to
+        )
+    finally:
+        srv.close()
+
+    assert ok and extracted
+    for name, content in files.items():
+        assert (extract_to / name).read_bytes() == content
@@ -20,10 +20,15 @@ from peft import (
 )
 from pathlib import Path
 
+from jsonl_shards import ShardedJsonlReader, shards_manifest_path
+from model_store import install_version
+
 # 设置
 MODEL_NAME = "Qwen/Qwen2.5-0.5B-Instruct"  # 阿里通义千问2.5 (0.5B) - 2024年9月发布
 OUTPUT_DIR = Path(__file__).parent / "models"
 DATA_FILE = Path(__file__).parent / "training_data.jsonl"
+# convert_to_jsonl.py --eval_ratio/--shard_size_mb 生成的分片清单，存在时优先使用
+SHARDS_FILE = shards_manifest_path(DATA_FILE)
 
 def tokenize_function(examples, tokenizer):
     """Token化文本"""
@@ -39,14 +44,28 @@ def main():
     print("=" * 70)
 
     # 1. 加载数据
-    print(f"\n📂 Loading dataset from {DATA_FILE}")
-    dataset = load_dataset("json", data_files=str(DATA_FILE), split="train")
-    print(f"✅ Loaded {len(dataset)} samples")
-
-    # 分割训练集和验证集
-    dataset = dataset.train_test_split(test_size=0.1, seed=42)
-    train_dataset = dataset["train"]
-    eval_dataset = dataset["test"]
+    train_files = ShardedJsonlReader(SHARDS_FILE, "train").files if SHARDS_FILE.exists() else []
+    eval_files = ShardedJsonlReader(SHARDS_FILE, "eval").files if SHARDS_FILE.exists() else []
+
+    if train_files and eval_files:
+        # 转换时已按 id 哈希划分好训练集和验证集
+        print(f"\n📂 Loading dataset shards from {SHARDS_FILE}")
+        dataset = load_dataset("json", data_files={"train": train_files, "test": eval_files})
+        train_dataset = dataset["train"]
+        eval_dataset = dataset["test"]
+    else:
+        if train_files:
+            # 只有训练集分片（转换时没有设置 --eval_ratio）
+            print(f"\n📂 Loading dataset shards from {SHARDS_FILE} ({len(train_files)} train shards)")
+        else:
+            print(f"\n📂 Loading dataset from {DATA_FILE}")
+        dataset = load_dataset("json", data_files=train_files or str(DATA_FILE), split="train")
+        print(f"✅ Loaded {len(dataset)} samples")
+
+        # 分割训练集和验证集
+        dataset = dataset.train_test_split(test_size=0.1, seed=42)
+        train_dataset = dataset["train"]
+        eval_dataset = dataset["test"]
     print(f"📊 Train: {len(train_dataset)}, Eval: {len(eval_dataset)}")
 
     # 2. 加载Tokenizer和模型
@@ -141,6 +160,10 @@ def main():
     tokenizer.save_pretrained(OUTPUT_DIR / "final_model")
     print(f"✅ Model saved to {OUTPUT_DIR / 'final_model'}")
 
+    # 10. 安装到模型版本库并设为当前版本（LLMTrajectoryGenerator 默认加载当前版本）
+    version = install_version(OUTPUT_DIR / "final_model")
+    print(f"📌 Installed as model store version {version}")
+
     print("\n🎉 Training complete!")
     print("=" * 70)
 
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+轨迹列式存储（可用 np.memmap 零拷贝读取）
+
+目录结构:
+    {store_dir}/
+    ├── meta.json          # 样本数、点数、各列的 dtype（最后写入，存在即表示写入完成）
+    ├── points.bin         # int32, 形状 (总点数, 3)，每行为一个 (a, b, c) 轨迹点
+    ├── offsets.bin        # int64, 形状 (样本数 + 1,)，第 i 个样本的点为 points[offsets[i]:offsets[i+1]]
+    ├── target_distance.bin  # int32, 形状 (样本数,)
+    ├── canvas_length.bin    # int32, 形状 (样本数,)
+    ├── ids.bin            # UTF-8 编码的样本 id 依次拼接
+    └── id_offsets.bin     # int64, 形状 (样本数 + 1,)，第 i 个 id 为 ids[id_offsets[i]:id_offsets[i+1]]
+
+使用方法:
+    from trajectory_store import TrajectoryStore
+
+    store = TrajectoryStore("captcha_dataset/trajectory_store")
+    print(len(store), store.points.shape)
+    tracks = store.tracks(0)  # ndarray (k, 3)，零拷贝视图
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence, Tuple, Union
+
+import numpy as np
+
+STORE_VERSION = 1
+
+POINT_DTYPE = np.dtype('<i4')
+OFFSET_DTYPE = np.dtype('<i8')
+
+# 列名 -> (文件名, dtype)
+COLUMNS = {
+    'points': ('points.bin', POINT_DTYPE),
+    'offsets': ('offsets.bin', OFFSET_DTYPE),
+    'target_distance': ('target_distance.bin', POINT_DTYPE),
+    'canvas_length': ('canvas_length.bin', POINT_DTYPE),
+    'ids': ('ids.bin', np.dtype('u1')),
+    'id_offsets': ('id_offsets.bin', OFFSET_DTYPE),
+}
+
+
+class TrajectoryStoreWriter:
+    """
+    流式写入轨迹列式存储
+
+    每个样本直接追加到各列文件，内存占用与样本数无关。
+    用法:
+        with TrajectoryStoreWriter(store_dir) as writer:
+            writer.add(sample_id, target_distance, canvas_length, tracks)
+    """
+
+    def __init__(self, store_dir: Union[str, Path]):
+        self.store_dir = Path(store_dir)
+        self.num_samples = 0
+        self.num_points = 0
+        self.id_bytes = 0
+        self._files = {}
+
+    def __enter__(self):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+        # 先删除 meta.json，写入中断时旧数据不会被误读
+        meta_path = self.store_dir / 'meta.json'
+        if meta_path.exists():
+            meta_path.unlink()
+
+        self._files = {
+            name: open(self.store_dir / filename, 'wb')
+            for name, (filename, _) in COLUMNS.items()
+        }
+        zero = np.zeros(1, dtype=OFFSET_DTYPE).tobytes()
+        self._files['offsets'].write(zero)
+        self._files['id_offsets'].write(zero)
+        return self
+
+    def add(
+        self,
+        sample_id: str,
+        target_distance: int,
+        canvas_length: int,
+        tracks: Union[np.ndarray, Sequence[Tuple[int, int, int]]]
+    ) -> None:
+        """
+        追加一个样本
+
+        Args:
+            sample_id: 样本 id（通常为标注文件的 id）
+            target_distance: 目标距离
+            canvas_length: 画布长度
+            tracks: 轨迹点，形状 (k, 3) 的 (a, b, c) 序列
+        """
+        points = np.asarray(tracks, dtype=POINT_DTYPE).reshape(-1, 3)
+        encoded_id = str(sample_id).encode('utf-8')
+
+        self._files['points'].write(points.tobytes())
+        self._files['target_distance'].write(np.array([target_distance], dtype=POINT_DTYPE).tobytes())
+        self._files['canvas_length'].write(np.array([canvas_length], dtype=POINT_DTYPE).tobytes())
+        self._files['ids'].write(encoded_id)
+
+        self.num_samples += 1
+        self.num_points += len(points)
+        self.id_bytes += len(encoded_id)
+
+        self._files['offsets'].write(np.array([self.num_points], dtype=OFFSET_DTYPE).tobytes())
+        self._files['id_offsets'].write(np.array([self.id_bytes], dtype=OFFSET_DTYPE).tobytes())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+        # 出错时不写 meta.json，存储保持不可读状态
+        if exc_type is not None:
+            return False
+
+        meta = {
+            'version': STORE_VERSION,
+            'num_samples': self.num_samples,
+            'num_points': self.num_points,
+            'id_bytes': self.id_bytes,
+            'columns': {name: {'file': filename, 'dtype': dtype.str} for name, (filename, dtype) in COLUMNS.items()}
+        }
+        tmp_path = self.store_dir / 'meta.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.store_dir / 'meta.json')
+        return False
+
+
+class TrajectoryStore:
+    """只读的轨迹列式存储，所有列都是 np.memmap（零拷贝）"""
+
+    def __init__(self, store_dir: Union[str, Path]):
+        self.store_dir = Path(store_dir)
+        meta_path = self.store_dir / 'meta.json'
+
+        if not meta_path.exists():
+            raise FileNotFoundError(f"轨迹存储不存在或未写入完成: {self.store_dir}")
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"不支持的轨迹存储版本: {self.meta.get('version')}")
+
+        n = self.meta['num_samples']
+        shapes = {
+            'points': (self.meta['num_points'], 3),
+            'offsets': (n + 1,),
+            'target_distance': (n,),
+            'canvas_length': (n,),
+            'ids': (self.meta['id_bytes'],),
+            'id_offsets': (n + 1,),
+        }
+        for name, shape in shapes.items():
+            setattr(self, name, self._open_column(name, shape))
+
+    def _open_column(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        column = self.meta['columns'][name]
+        dtype = np.dtype(column['dtype'])
+        if int(np.prod(shape)) == 0:
+            # np.memmap 不支持映射空文件
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.store_dir / column['file'], dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.meta['num_samples']
+
+    def tracks(self, index: int) -> np.ndarray:
+        """第 index 个样本的轨迹点，形状 (k, 3)"""
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def sample_id(self, index: int) -> str:
+        """第 index 个样本的 id"""
+        return bytes(self.ids[self.id_offsets[index]:self.id_offsets[index + 1]]).decode('utf-8')
+
+    def lengths(self) -> np.ndarray:
+        """每个样本的轨迹点数"""
+        return np.diff(self.offsets)
+
+    def __iter__(self) -> Iterator[Tuple[str, int, int, np.ndarray]]:
+        """依次产出 (id, target_distance, canvas_length, tracks)"""
+        for i in range(len(self)):
+            yield self.sample_id(i), int(self.target_distance[i]), int(self.canvas_length[i]), self.tracks(i)
+
+
+def write_store(
+    store_dir: Union[str, Path],
+    samples: Iterable[Tuple[str, int, int, Sequence[Tuple[int, int, int]]]]
+) -> int:
+    """
+    将 (id, target_distance, canvas_length, tracks) 序列写入列式存储
+
+    Returns:
+        写入的样本数
+    """
+    with TrajectoryStoreWriter(store_dir) as writer:
+        for sample_id, target_distance, canvas_length, tracks in samples:
+            writer.add(sample_id, target_distance, canvas_length, tracks)
+    return writer.num_samples